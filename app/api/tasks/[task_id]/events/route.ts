@@ -0,0 +1,36 @@
+import { NextResponse } from 'next/server';
+
+// Never cache or pre-render: this route proxies a live Server-Sent Events stream
+export const dynamic = 'force-dynamic';
+
+export async function GET(request: Request, context: { params: Promise<{ task_id: string }> }) {
+  const { task_id } = await context.params;
+  try {
+    const workerResponse = await fetch(`http://worker:8000/tasks/${task_id}/events`, {
+      cache: 'no-store',
+      signal: request.signal,
+    });
+
+    if (!workerResponse.ok || !workerResponse.body) {
+      const errorData = await workerResponse.json().catch(() => ({}));
+      return NextResponse.json(
+        { message: errorData.detail || 'Failed to open task event stream from worker' },
+        { status: workerResponse.status }
+      );
+    }
+
+    return new Response(workerResponse.body, {
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache, no-transform',
+        Connection: 'keep-alive',
+      },
+    });
+  } catch (error) {
+    console.error(`Error in /api/tasks/${task_id}/events:`, error);
+    return NextResponse.json(
+      { message: 'Internal server error', error: (error as Error).message },
+      { status: 500 }
+    );
+  }
+}
@@ -2,8 +2,10 @@ import { NextResponse } from 'next/server';
 
 export async function GET(request: Request, context: { params: Promise<{ task_id: string }> }) {
   const { task_id } = await context.params;
+  // Forward log pagination parameters (since, updatedSince, limit) to the worker
+  const { search } = new URL(request.url);
   try {
-    const workerResponse = await fetch(`http://worker:8000/tasks/${task_id}`);
+    const workerResponse = await fetch(`http://worker:8000/tasks/${task_id}${search}`);
 
     if (!workerResponse.ok) {
       const errorData = await workerResponse.json();
@@ -0,0 +1,26 @@
+import { NextResponse } from 'next/server';
+
+export async function GET(request: Request) {
+  // Forward the filters (ids, status, accountId, logs, messageChars, limit) to the worker
+  const { search } = new URL(request.url);
+  try {
+    const workerResponse = await fetch(`http://worker:8000/tasks${search}`);
+
+    if (!workerResponse.ok) {
+      const errorData = await workerResponse.json();
+      return NextResponse.json(
+        { message: errorData.detail || 'Failed to fetch tasks from worker' },
+        { status: workerResponse.status }
+      );
+    }
+
+    const data = await workerResponse.json();
+    return NextResponse.json(data);
+  } catch (error) {
+    console.error('Error in /api/tasks:', error);
+    return NextResponse.json(
+      { message: 'Internal server error', error: (error as Error).message },
+      { status: 500 }
+    );
+  }
+}
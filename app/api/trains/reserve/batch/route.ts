@@ -0,0 +1,33 @@
+// web/app/api/trains/reserve/batch/route.ts
+import { NextResponse } from 'next/server';
+
+export async function POST(request: Request) {
+  try {
+    const body = await request.json();
+    // Forward the batch ({ tasks: [...] }) to the worker, which inserts it in one transaction
+    const workerResponse = await fetch('http://worker:8000/reserve/batch', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body),
+    });
+
+    if (!workerResponse.ok) {
+      const errorData = await workerResponse.json();
+      return NextResponse.json(
+        { message: errorData.detail || 'Failed to create reservation tasks in worker' },
+        { status: workerResponse.status }
+      );
+    }
+
+    const data = await workerResponse.json();
+    return NextResponse.json(data);
+  } catch (error) {
+    console.error('Error in /api/trains/reserve/batch:', error);
+    return NextResponse.json(
+      { message: 'Internal server error', error: (error as Error).message },
+      { status: 500 }
+    );
+  }
+}
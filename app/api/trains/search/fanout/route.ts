@@ -0,0 +1,42 @@
+// web/app/api/trains/search/fanout/route.ts
+import { NextResponse } from 'next/server';
+
+// Never cache or pre-render: this route proxies a live NDJSON stream
+export const dynamic = 'force-dynamic';
+
+export async function POST(request: Request) {
+  try {
+    const body = await request.json();
+    // Forward { accountId, trainMode, dates, routes, timeFrom } to the worker, which streams one line per search
+    const workerResponse = await fetch('http://worker:8000/search/fanout', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body),
+      cache: 'no-store',
+      signal: request.signal,
+    });
+
+    if (!workerResponse.ok || !workerResponse.body) {
+      const errorData = await workerResponse.json().catch(() => ({}));
+      return NextResponse.json(
+        { message: errorData.detail || 'Failed to search trains in worker' },
+        { status: workerResponse.status }
+      );
+    }
+
+    return new Response(workerResponse.body, {
+      headers: {
+        'Content-Type': 'application/x-ndjson',
+        'Cache-Control': 'no-cache, no-transform',
+      },
+    });
+  } catch (error) {
+    console.error('Error in /api/trains/search/fanout:', error);
+    return NextResponse.json(
+      { message: 'Internal server error', error: (error as Error).message },
+      { status: 500 }
+    );
+  }
+}
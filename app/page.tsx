@@ -49,12 +49,57 @@ export interface TrainResult {
   trainId: string;
 }
 
+interface TaskLog {
+  id?: number;
+  level: string;
+  message: string;
+  createdAt: string;
+  repeatCount?: number; // Repeats of this message folded into this entry
+  lastAt?: string;
+}
+
+// Messages repeating one of the last LOG_COMPACTION_WINDOW entries are folded into that entry
+const LOG_COMPACTION_WINDOW = 4;
+
+// Appends logs, folding repeated messages into an earlier entry the same way the worker stores them
+function appendLogs(logs: TaskLog[], incoming: TaskLog[]): TaskLog[] {
+  const merged = [...logs];
+  for (const log of incoming) {
+    let index = merged.length - 1;
+    const stop = Math.max(0, merged.length - LOG_COMPACTION_WINDOW);
+    while (index >= stop && !(merged[index].level === log.level && merged[index].message === log.message)) {
+      index--;
+    }
+    if (index >= stop) {
+      const entry = merged[index];
+      merged[index] = {
+        ...entry,
+        repeatCount: (entry.repeatCount ?? 1) + (log.repeatCount ?? 1),
+        lastAt: log.lastAt ?? log.createdAt,
+      };
+    } else {
+      merged.push(log);
+    }
+  }
+  return merged;
+}
+
+// Merges log rows read from the database (polling pages, `logs` stream events): rows already shown were updated by later repeats and replace the old entry
+function mergeLogPage(logs: TaskLog[], page: TaskLog[]): TaskLog[] {
+  const rows = new Map(page.map((log) => [log.id, log]));
+  const merged = logs.map((log) => (log.id !== undefined && rows.has(log.id) ? rows.get(log.id)! : log));
+  const known = new Set(logs.map((log) => log.id));
+  return [...merged, ...page.filter((log) => !known.has(log.id))];
+}
+
 export default function Home() {
   const [mode, setMode] = React.useState<TrainMode>('KTX');
   const [depStation, setDepStation] = React.useState({ name: '서울', code: '0001' });
   const [arrStation, setArrStation] = React.useState({ name: '부산', code: '0017' });
   const [date, setDate] = React.useState<Date | undefined>(new Date());
   const [time, setTime] = React.useState('09:00');
+  // Seat class the macro may book; 'any' takes whichever class opens up first
+  const [seatClass, setSeatClass] = React.useState<'any' | '일반실' | '특실'>('any');
   const [selectedAccountId, setSelectedAccountId] = React.useState<number | null>(null);
   
   const [trainSearchResults, setTrainSearchResults] = React.useState<TrainResult[] | null>(null);
@@ -64,6 +109,8 @@ export default function Home() {
   // New state for reservation task
   const [currentTaskId, setCurrentTaskId] = React.useState<number | null>(null);
   const [taskStatus, setTaskStatus] = React.useState<any>(null); // To store full task status with logs
+  const logCursorRef = React.useRef<number | null>(null); // Id of the last task log received
+  const logUpdatedCursorRef = React.useRef<string | null>(null); // Latest lastAt received, to pick up compacted repeats
 
   // New state for frontend logs
   const [frontendLogs, setFrontendLogs] = React.useState<string[]>([]);
@@ -90,16 +137,28 @@ export default function Home() {
 
   React.useEffect(() => {
     let intervalId: NodeJS.Timeout | undefined;
+    let eventSource: EventSource | undefined;
 
     const fetchTaskStatus = async (id: number) => {
       addFrontendLog(`Fetching task status for ID: ${id}`);
       try {
-        const response = await fetch(`/api/tasks/${id}`);
+        // Only ask for logs newer than the ones we already have
+        const cursor = logCursorRef.current;
+        const updatedCursor = logUpdatedCursorRef.current;
+        const query = cursor !== null
+          ? `?since=${cursor}${updatedCursor ? `&updatedSince=${encodeURIComponent(updatedCursor)}` : ''}`
+          : '';
+        const response = await fetch(`/api/tasks/${id}${query}`);
         addFrontendLog(`Response status for task ${id}: ${response.status} ${response.statusText}`);
         if (response.ok) {
           const statusData = await response.json();
           addFrontendLog(`Received task status data for ID: ${id}: ${JSON.stringify(statusData)}`);
-          setTaskStatus(statusData);
+          logCursorRef.current = statusData.nextCursor ?? cursor;
+          logUpdatedCursorRef.current = statusData.updatedCursor ?? updatedCursor;
+          setTaskStatus((prev: any) => ({
+            ...statusData,
+            logs: cursor !== null && prev ? mergeLogPage(prev.logs, statusData.logs) : statusData.logs,
+          }));
           if (!statusData.isActive || statusData.status === 'SUCCESS' || statusData.status === 'FAILED' || statusData.status === 'STOPPED') {
             addFrontendLog(`Task ${id} finished with status: ${statusData.status}. Clearing interval.`, statusData.status === 'FAILED' ? 'ERROR' : 'INFO');
             clearInterval(intervalId);
@@ -125,14 +184,71 @@ export default function Home() {
       }
     };
 
+    const startPolling = (id: number) => {
+      logCursorRef.current = null;
+      logUpdatedCursorRef.current = null;
+      // Fetch immediately, then set interval
+      fetchTaskStatus(id);
+      intervalId = setInterval(() => fetchTaskStatus(id), 1000); // Poll every 1 second
+    };
+
     if (currentTaskId) {
       addFrontendLog(`Starting monitoring for task ID: ${currentTaskId}`);
-      // Fetch immediately, then set interval
-      fetchTaskStatus(currentTaskId);
-      intervalId = setInterval(() => fetchTaskStatus(currentTaskId), 1000); // Poll every 1 second
+      logCursorRef.current = null;
+      if (typeof EventSource !== 'undefined') {
+        // Stream status changes and new log lines instead of polling
+        let snapshotData: any = null;
+        const finishStream = (status: string) => {
+          eventSource?.close();
+          eventSource = undefined;
+          addFrontendLog(`Task ${currentTaskId} finished with status: ${status}. Closing event stream.`, status === 'FAILED' ? 'ERROR' : 'INFO');
+          setCurrentTaskId(null); // Task is complete, stop monitoring
+          if (snapshotData) {
+            setMessage(`Task ${status}: ${snapshotData.depStation} -> ${snapshotData.arrStation} (${snapshotData.selectedDepTime})`);
+          }
+        };
+
+        eventSource = new EventSource(`/api/tasks/${currentTaskId}/events`);
+        eventSource.addEventListener('snapshot', (event) => {
+          snapshotData = JSON.parse((event as MessageEvent).data);
+          addFrontendLog(`Received task snapshot for ID: ${currentTaskId}`);
+          setTaskStatus(snapshotData);
+          if (!snapshotData.isActive) {
+            finishStream(snapshotData.status);
+          }
+        });
+        eventSource.addEventListener('log', (event) => {
+          const log = JSON.parse((event as MessageEvent).data);
+          setTaskStatus((prev: any) => (prev ? { ...prev, logs: appendLogs(prev.logs, [log]) } : prev));
+        });
+        eventSource.addEventListener('logs', (event) => {
+          // Rows read from the database while another worker polls the task
+          const { logs } = JSON.parse((event as MessageEvent).data);
+          setTaskStatus((prev: any) => (prev ? { ...prev, logs: mergeLogPage(prev.logs, logs) } : prev));
+        });
+        eventSource.addEventListener('status', (event) => {
+          const update = JSON.parse((event as MessageEvent).data);
+          setTaskStatus((prev: any) => (prev ? { ...prev, status: update.status, isActive: update.isActive } : prev));
+          if (!update.isActive) {
+            finishStream(update.status);
+          }
+        });
+        eventSource.onerror = () => {
+          addFrontendLog(`Event stream for task ${currentTaskId} failed. Falling back to polling.`, 'ERROR');
+          eventSource?.close();
+          eventSource = undefined;
+          startPolling(currentTaskId);
+        };
+      } else {
+        startPolling(currentTaskId);
+      }
     }
 
     return () => {
+      if (eventSource) {
+        addFrontendLog(`Closing event stream for task ID: ${currentTaskId}`);
+        eventSource.close();
+      }
       if (intervalId) {
         addFrontendLog(`Cleaning up interval for task ID: ${currentTaskId}`);
         clearInterval(intervalId);
@@ -234,7 +350,7 @@ export default function Home() {
           selectedTrainType: train.trainType,
           selectedDepTime: train.depTime,
           selectedArrTime: train.arrTime,
-          selectedTrainClass: train.generalSeatAvailable ? '일반실' : (train.specialSeatAvailable ? '특실' : null),
+          selectedTrainClass: seatClass === 'any' ? null : seatClass,
           selectedTrainId: train.trainId,
         }),
       });
@@ -305,6 +421,7 @@ export default function Home() {
             task.logs.map((log: any, idx: number) => (
               <p key={idx} className={log.level === 'ERROR' ? 'text-red-500' : ''}>
                 [{new Date(log.createdAt).toLocaleTimeString()}] {log.level}: {log.message}
+                {log.repeatCount > 1 && ` (x${log.repeatCount}, last ${new Date(log.lastAt).toLocaleTimeString()})`}
               </p>
             ))
           ) : (
@@ -430,6 +547,20 @@ export default function Home() {
                       </Select>
                     </div>
                   </div>
+
+                  <div className="space-y-2">
+                    <label>Seat class</label>
+                    <Select value={seatClass} onValueChange={(value) => setSeatClass(value as 'any' | '일반실' | '특실')}>
+                      <SelectTrigger>
+                        <SelectValue placeholder="Select seat class" />
+                      </SelectTrigger>
+                      <SelectContent>
+                        <SelectItem value="any">Any (일반실 or 특실)</SelectItem>
+                        <SelectItem value="일반실">일반실 only</SelectItem>
+                        <SelectItem value="특실">특실 only</SelectItem>
+                      </SelectContent>
+                    </Select>
+                  </div>
                 </CardContent>
                 <CardFooter className="flex flex-col items-center space-y-4">
                   <Button type="submit" disabled={isLoading || !!currentTaskId} className="w-full h-12 text-lg">
@@ -458,7 +589,7 @@ export default function Home() {
                       <Card key={index} className="w-full">
                         <CardHeader>
                           <CardTitle className="text-lg flex justify-between items-center">
-                            <span>{train.trainType} ({train.trainNo.split('-')[0]})</span>
+                            <span>{train.trainType} {train.trainNo}</span>
                             <span className="text-sm font-normal text-gray-500">
                               {train.depTime.slice(0, 2)}:{train.depTime.slice(2)} ~ {train.arrTime.slice(0, 2)}:{train.arrTime.slice(2)}
                             </span>
@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "Log_taskId_createdAt_idx" ON "Log"("taskId", "createdAt");
@@ -0,0 +1,3 @@
+-- AlterTable
+ALTER TABLE "Task" ADD COLUMN     "leaseExpiresAt" TIMESTAMP(3),
+ADD COLUMN     "leaseOwner" TEXT;
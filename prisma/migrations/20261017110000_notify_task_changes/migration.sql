@@ -0,0 +1,28 @@
+-- Notify workers about new tasks and task state changes so they can pick them up
+-- without waiting for their fallback poll. Lease renewals do not notify.
+CREATE OR REPLACE FUNCTION "Task_notify_change"() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify(
+    'task_changes',
+    json_build_object(
+      'id', NEW."id",
+      'op', TG_OP,
+      'status', NEW."status",
+      'isActive', NEW."isActive"
+    )::text
+  );
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- CreateTrigger
+CREATE TRIGGER "Task_notify_insert"
+AFTER INSERT ON "Task"
+FOR EACH ROW EXECUTE FUNCTION "Task_notify_change"();
+
+-- CreateTrigger
+CREATE TRIGGER "Task_notify_update"
+AFTER UPDATE OF "status", "isActive" ON "Task"
+FOR EACH ROW
+WHEN (OLD."status" IS DISTINCT FROM NEW."status" OR OLD."isActive" IS DISTINCT FROM NEW."isActive")
+EXECUTE FUNCTION "Task_notify_change"();
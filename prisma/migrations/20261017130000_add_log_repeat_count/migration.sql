@@ -0,0 +1,6 @@
+-- AlterTable
+ALTER TABLE "Log" ADD COLUMN     "lastAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+ADD COLUMN     "repeatCount" INTEGER NOT NULL DEFAULT 1;
+
+-- Existing rows occurred once, at createdAt
+UPDATE "Log" SET "lastAt" = "createdAt";
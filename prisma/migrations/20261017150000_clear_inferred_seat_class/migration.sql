@@ -0,0 +1,5 @@
+-- The dashboard used to fill selectedTrainClass from the seat that happened to be
+-- open at search time, and the worker ignored it. The worker now books only the
+-- given class, so clear the inferred values of running tasks: they book any class.
+UPDATE "Task" SET "selectedTrainClass" = NULL
+WHERE "isActive" = true AND "selectedTrainClass" IS NOT NULL;
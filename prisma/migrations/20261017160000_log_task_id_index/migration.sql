@@ -0,0 +1,5 @@
+-- DropIndex
+DROP INDEX "Log_taskId_createdAt_idx";
+
+-- CreateIndex
+CREATE INDEX "Log_taskId_id_idx" ON "Log"("taskId", "id");
@@ -1,25 +1,178 @@
 # worker/app.py
 import os
 import sys
+import importlib
+import socket
 import time
 import logging
 import threading
-import re
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
-from sqlalchemy.orm import joinedload
+from anyio import to_thread
+from sqlalchemy import or_
 
-from train_api.korail import KorailWrapper
-from train_api.srt import SRTWrapper
-from database import get_active_tasks, update_task_status, add_log, SessionLocal, Account, Task # Import SessionLocal, Account, Task
-from notifier import send_push
+from train_api.mock import MockTrainAPIWrapper
+from train_api.base import TrainIndex, normalize_time
+from database import get_active_tasks, claim_tasks, load_tasks, load_recent_logs, prune_finished_task_logs, release_leases, add_log, publish_status, TaskUnitOfWork, log_sink, wait_for_db, create_schema, Engine, SessionLocal, SQLALCHEMY_DATABASE_URL, Account, Task, Log # Import SessionLocal, Account, Task
+from notifier import send_push, dispatcher as notification_dispatcher
+from scheduler import TaskScheduler
+from executor import TaskExecutor, parse_limits
+from rate_limiter import AdaptiveRateLimiter
+from search_cache import SearchCache
+from driver_pool import DriverPool, DriverLoginError
+from task_events import task_events
+from task_listener import TaskChangeListener
+from stations import station_catalog, StationError
+from profiling import profiler, span, ProfilerBusy
+from metrics import (
+    registry as metrics_registry, instrument_database, upstream_latency, scheduler_tick_seconds,
+    scheduler_sync_seconds, scheduler_lag_seconds, task_cycle_seconds,
+)
 
 
 # Configure logging
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
+# Postgres LISTEN/NOTIFY wake-ups for task inserts, cancellations and state
+# changes (see the Task_notify_change trigger).
+TASK_NOTIFY_ENABLED = os.getenv("TASK_NOTIFY_ENABLED", "true").lower() == "true"
+# Must match the channel in the Task_notify_change trigger migration
+TASK_NOTIFY_CHANNEL = "task_changes"
+
+# How often the scheduler reconciles its queue with the Task table (seconds).
+# Tasks created through the worker API are scheduled immediately and other
+# changes arrive as notifications, so with notifications enabled this is only a
+# slow fallback.
+SCHEDULER_SYNC_SECONDS = float(os.getenv("SCHEDULER_SYNC_SECONDS", "30" if TASK_NOTIFY_ENABLED else "5"))
+
+# Task leasing between worker replicas. Each sync renews this worker's leases,
+# so TASK_LEASE_SECONDS must comfortably exceed SCHEDULER_SYNC_SECONDS; tasks of
+# a crashed worker are reclaimed once their lease runs out.
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "90"))
+MAX_CLAIMED_TASKS = int(os.getenv("MAX_CLAIMED_TASKS", "1000"))
+# Each worker holds about (active tasks / live workers) and takes over at most
+# TASK_CLAIM_BATCH_SIZE unleased tasks per sync, so replicas split the work.
+TASK_CLAIM_BATCH_SIZE = int(os.getenv("TASK_CLAIM_BATCH_SIZE", "100"))
+# How long shutdown waits for the scheduler loop to finish its current sync or dispatch
+SHUTDOWN_JOIN_SECONDS = float(os.getenv("SHUTDOWN_JOIN_SECONDS", "10"))
+
+# Concurrency caps for task cycles. PROVIDER_CONCURRENCY_LIMITS overrides the
+# per-provider default, e.g. "KTX=6,SRT=3".
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "6"))
+ACCOUNT_CONCURRENCY = int(os.getenv("ACCOUNT_CONCURRENCY", "1"))
+PROVIDER_CONCURRENCY = int(os.getenv("PROVIDER_CONCURRENCY", "4"))
+PROVIDER_CONCURRENCY_LIMITS = parse_limits(os.getenv("PROVIDER_CONCURRENCY_LIMITS", ""))
+# Delay before retrying a due task that could not be admitted because of a cap.
+TASK_DEFER_SECONDS = float(os.getenv("TASK_DEFER_SECONDS", "0.2"))
+# Delay before retrying tasks whose tick failed as a whole (e.g. the database was unreachable).
+TASK_ERROR_RETRY_SECONDS = float(os.getenv("TASK_ERROR_RETRY_SECONDS", "5"))
+# Tasks falling due within this window are batched into the current tick so
+# identical searches can be coalesced.
+SEARCH_COALESCE_WINDOW = float(os.getenv("SEARCH_COALESCE_WINDOW", "0.25"))
+
+# Request budget per provider and per account (requests/second), shared by
+# searches and reservations. PROVIDER_RATE_LIMITS overrides the provider
+# default, e.g. "KTX=8,SRT=4". Budgets shrink on errors/throttling and task
+# polling intervals stretch with them.
+PROVIDER_RATE_LIMIT = float(os.getenv("PROVIDER_RATE_LIMIT", "5"))
+PROVIDER_RATE_LIMITS = parse_limits(os.getenv("PROVIDER_RATE_LIMITS", ""), cast=float)
+ACCOUNT_RATE_LIMIT = float(os.getenv("ACCOUNT_RATE_LIMIT", "2"))
+# Polling interval (seconds) for tasks created without one
+DEFAULT_TASK_INTERVAL = int(os.getenv("DEFAULT_TASK_INTERVAL", "1"))
+
+# Polling cadence by time to departure. Tasks departing within
+# HOT_LANE_WINDOW_MINUTES go to the hot lane: polled every
+# HOT_LANE_INTERVAL_SECONDS with a dedicated, pre-warmed driver per account.
+# Far-off tasks are slowed down by FAR_TASK_INTERVAL_SCALES, given as
+# "hours ahead=interval multiplier" tiers, e.g. "24=2,72=5,336=10".
+HOT_LANE_WINDOW_MINUTES = float(os.getenv("HOT_LANE_WINDOW_MINUTES", "180"))
+HOT_LANE_INTERVAL_SECONDS = float(os.getenv("HOT_LANE_INTERVAL_SECONDS", "0.5"))
+FAR_TASK_INTERVAL_SCALES = sorted(
+    (float(hours), scale)
+    for hours, scale in parse_limits(os.getenv("FAR_TASK_INTERVAL_SCALES", "24=2,72=5,336=10"), cast=float).items()
+)
+# Task dates and departure times are Korean local time (UTC+9)
+DEPARTURE_UTC_OFFSET_HOURS = float(os.getenv("DEPARTURE_UTC_OFFSET_HOURS", "9"))
+
+# Short-lived cache for /search results so quick re-submits of the same query
+# do not reach the provider again.
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "5"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256"))
+
+# Page size for task logs returned by GET /tasks/{task_id}
+LOG_PAGE_DEFAULT_LIMIT = int(os.getenv("LOG_PAGE_DEFAULT_LIMIT", "100"))
+LOG_PAGE_MAX_LIMIT = int(os.getenv("LOG_PAGE_MAX_LIMIT", "1000"))
+# POST /search/fanout: most (date, route) searches per request, and how many
+# of them run at once (the provider/account rate limits still apply per call)
+SEARCH_FANOUT_MAX_SEARCHES = int(os.getenv("SEARCH_FANOUT_MAX_SEARCHES", "24"))
+SEARCH_FANOUT_CONCURRENCY = int(os.getenv("SEARCH_FANOUT_CONCURRENCY", "4"))
+# Bulk endpoints: tasks per POST /reserve/batch and GET /tasks, and the most
+# recent logs (and characters per log message) GET /tasks may attach per task
+RESERVE_BATCH_MAX_TASKS = int(os.getenv("RESERVE_BATCH_MAX_TASKS", "100"))
+TASK_LIST_MAX_TASKS = int(os.getenv("TASK_LIST_MAX_TASKS", "200"))
+TASK_LIST_MAX_LOGS = int(os.getenv("TASK_LIST_MAX_LOGS", "20"))
+TASK_LIST_LOG_MESSAGE_CHARS = int(os.getenv("TASK_LIST_LOG_MESSAGE_CHARS", "200"))
+
+# Logs of finished tasks are deleted LOG_RETENTION_DAYS after the task ended
+# (0 keeps them forever); the pruning pass runs every LOG_PRUNE_INTERVAL_SECONDS.
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "30"))
+LOG_PRUNE_INTERVAL_SECONDS = float(os.getenv("LOG_PRUNE_INTERVAL_SECONDS", "3600"))
+
+# Seconds between keepalive comments on idle task event streams
+EVENT_STREAM_KEEPALIVE_SECONDS = float(os.getenv("EVENT_STREAM_KEEPALIVE_SECONDS", "15"))
+# Seconds between database checks on streams of tasks another worker polls
+EVENT_STREAM_POLL_SECONDS = float(os.getenv("EVENT_STREAM_POLL_SECONDS", "2"))
+
+# On-demand profiling (POST /admin/profile): most units one capture may take,
+# and how long a capture stays armed before it ends on its own
+PROFILE_MAX_UNITS = int(os.getenv("PROFILE_MAX_UNITS", "10000"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# Create missing tables from the SQLAlchemy models once the database is up.
+# Off by default: Prisma migrations own the schema.
+CREATE_SCHEMA_ON_STARTUP = os.getenv("CREATE_SCHEMA_ON_STARTUP", "false").lower() == "true"
+
+# Threads available to blocking API handlers (DB queries, provider calls).
+API_WORKER_THREADS = int(os.getenv("API_WORKER_THREADS", "40"))
+
+# Logged-in driver pool. Sessions are re-logged in by a background thread
+# DRIVER_REFRESH_MARGIN_SECONDS before DRIVER_SESSION_TTL_SECONDS runs out.
+DRIVER_POOL_MAX_SIZE = int(os.getenv("DRIVER_POOL_MAX_SIZE", "64"))
+DRIVER_IDLE_TTL_SECONDS = float(os.getenv("DRIVER_IDLE_TTL_SECONDS", "1800"))
+DRIVER_SESSION_TTL_SECONDS = float(os.getenv("DRIVER_SESSION_TTL_SECONDS", "1200"))
+DRIVER_REFRESH_MARGIN_SECONDS = float(os.getenv("DRIVER_REFRESH_MARGIN_SECONDS", "120"))
+
+# Serve every train mode from the in-process mock provider (local runs and benchmark.py).
+# MOCK_* tune its latency, seat availability and injected error rate.
+MOCK_TRAIN_PROVIDER = os.getenv("MOCK_TRAIN_PROVIDER", "false").lower() == "true"
+MOCK_LATENCY_SECONDS = float(os.getenv("MOCK_LATENCY_SECONDS", "0.05"))
+MOCK_LATENCY_JITTER_SECONDS = float(os.getenv("MOCK_LATENCY_JITTER_SECONDS", "0"))
+MOCK_SEAT_PROBABILITY = float(os.getenv("MOCK_SEAT_PROBABILITY", "0.1"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+
+scheduler = TaskScheduler(min_interval=min(1.0, HOT_LANE_INTERVAL_SECONDS))
+executor = TaskExecutor(
+    max_workers=TASK_WORKERS,
+    per_account_limit=ACCOUNT_CONCURRENCY,
+    per_provider_limit=PROVIDER_CONCURRENCY,
+    provider_limits=PROVIDER_CONCURRENCY_LIMITS,
+)
+rate_limiter = AdaptiveRateLimiter(
+    provider_rates=PROVIDER_RATE_LIMITS,
+    default_provider_rate=PROVIDER_RATE_LIMIT,
+    account_rate=ACCOUNT_RATE_LIMIT,
+)
+search_cache = SearchCache(ttl_seconds=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+
 
 # --- Pydantic Models for API Request/Response ---
 class SearchRequest(BaseModel):
@@ -29,6 +182,19 @@ class SearchRequest(BaseModel):
     arrStationName: str
     date: str
     timeFrom: str
+    bypassCache: bool = False # Skip the short-lived result cache and query the provider
+
+class SearchRoute(BaseModel):
+    depStationName: str
+    arrStationName: str
+
+class FanoutSearchRequest(BaseModel):
+    accountId: int
+    trainMode: str
+    dates: List[str] # YYYYMMDD
+    routes: List[SearchRoute] # e.g. 서울->부산 and 수서->부산 for the same trip
+    timeFrom: str
+    bypassCache: bool = False
 
 class TrainResult(BaseModel):
     trainNo: str
@@ -44,6 +210,11 @@ class TrainResult(BaseModel):
     runDate: str
     trainId: str # Unique ID for the train from the library
 
+class CandidateTrain(BaseModel):
+    trainType: str
+    depTime: str
+    trainNo: Optional[str] = None
+
 class ReserveRequest(BaseModel):
     accountId: int
     trainMode: str
@@ -51,17 +222,26 @@ class ReserveRequest(BaseModel):
     arrStation: str
     date: str
     timeFrom: str
-    selectedTrainNo: str
-    selectedTrainType: str
-    selectedDepTime: str
-    selectedArrTime: str
-    selectedTrainClass: Optional[str] = None
-    selectedTrainId: str
+    timeTo: Optional[str] = None # With no selected/candidate trains: book any train departing up to this time
+    selectedTrainNo: Optional[str] = None
+    selectedTrainType: Optional[str] = None
+    selectedDepTime: Optional[str] = None
+    selectedArrTime: Optional[str] = None
+    selectedTrainClass: Optional[str] = None # "일반실" / "특실"; any class if omitted
+    selectedTrainId: Optional[str] = None
+    candidateTrains: Optional[List[CandidateTrain]] = None # Further acceptable trains, in order of preference
+    interval: Optional[int] = None # Polling interval in seconds; DEFAULT_TASK_INTERVAL if omitted
+
+class ReserveBatchRequest(BaseModel):
+    tasks: List[ReserveRequest]
 
 class LogModel(BaseModel):
+    id: int
     level: str
     message: str
-    createdAt: str
+    createdAt: str # First occurrence
+    repeatCount: int = 1 # Repeats of this message collapsed into this entry
+    lastAt: Optional[str] = None # Last occurrence
 
 class TaskStatusModel(BaseModel):
     id: int
@@ -72,187 +252,748 @@ class TaskStatusModel(BaseModel):
     arrStation: str
     selectedTrainType: str
     selectedDepTime: str
+    nextCursor: Optional[int] = None # Pass as `since` to fetch only newer logs
+    updatedCursor: Optional[str] = None # Pass as `updatedSince` to also fetch logs updated by later repeats
+    hasMore: bool = False # More logs after this page are already available
+
+class TaskSummaryModel(BaseModel):
+    id: int
+    accountId: int
+    status: str
+    isActive: bool
+    depStation: str
+    arrStation: str
+    date: str
+    timeFrom: str
+    selectedTrainType: str
+    selectedDepTime: str
+    bookedDetail: Optional[str] = None
+    logs: List[LogModel] = [] # Most recent `logs` entries, oldest first; messages may be truncated
 
 
 
 # --- FastAPI App Setup ---
 # Use asynccontextmanager for startup/shutdown events
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup: Ensure DB is ready, then start the background worker thread
-    logging.info("FastAPI app starting up. Waiting for database...")
-    from database import wait_for_db
-    wait_for_db() # Wait for DB to be ready
+# Startup state reported by GET /healthz and GET /readyz
+worker_ready = threading.Event()
+startup_failed = threading.Event()
+# Set on shutdown to stop the scheduler loop and the log retention thread
+shutdown_requested = threading.Event()
+
+
+def log_retention_loop():
+    """Periodically deletes logs of tasks that finished more than LOG_RETENTION_DAYS ago."""
+    while not shutdown_requested.wait(LOG_PRUNE_INTERVAL_SECONDS):
+        try:
+            deleted = prune_finished_task_logs(LOG_RETENTION_DAYS)
+            if deleted:
+                logging.info(f"Worker: Pruned {deleted} logs of tasks finished over {LOG_RETENTION_DAYS:g} days ago.")
+        except Exception as e:
+            logging.error(f"Worker: Log retention pass failed - {e}", exc_info=True)
+
+
+def start_background_services():
+    """
+    Waits for the database, then starts the task listener and the scheduler
+    loop. Runs on its own thread so the app serves /healthz while the database
+    comes up.
+    """
+    try:
+        wait_for_db()
+        if CREATE_SCHEMA_ON_STARTUP:
+            create_schema()
+    except Exception as e:
+        logging.error(f"Worker: Startup failed, database not available - {e}")
+        startup_failed.set()
+        return
+
+    if TASK_NOTIFY_ENABLED and SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
+        task_listener.start()
 
     logging.info("Initializing background worker thread...")
-    worker_thread = threading.Thread(target=main_loop, daemon=True)
-    worker_thread.start()
+    main_loop_thread.start()
+    if LOG_RETENTION_DAYS > 0:
+        threading.Thread(target=log_retention_loop, name="log-retention", daemon=True).start()
+    worker_ready.set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: only in-process setup here; the database wait happens in the background
+    to_thread.current_default_thread_limiter().total_tokens = API_WORKER_THREADS
+    logging.info("FastAPI app starting up. Waiting for database in the background...")
+    driver_pool.start()
+    log_sink.start()
+    threading.Thread(target=start_background_services, name="startup", daemon=True).start()
     yield
-    # Shutdown: (Optional) You can add cleanup code here if needed
+    # Shutdown: stop handing out new task cycles
     logging.info("FastAPI app shutting down.")
+    shutdown_requested.set()
+    scheduler.wake()
+    if main_loop_thread.is_alive():
+        # No sync may lease tasks back to this worker after release_leases below
+        main_loop_thread.join(SHUTDOWN_JOIN_SECONDS)
+    task_listener.stop()
+    executor.shutdown(wait=False)
+    try:
+        release_leases(WORKER_ID) # Let other replicas take over our tasks right away
+    except Exception as e:
+        logging.warning(f"Failed to release task leases on shutdown: {e}")
+    driver_pool.stop()
+    driver_prewarm_executor.shutdown(wait=False, cancel_futures=True)
+    log_sink.stop() # Flush buffered task logs
+    notification_dispatcher.stop() # Deliver queued push notifications
 
 app = FastAPI(lifespan=lifespan)
 
-# For demonstration purposes, we'll keep a simple in-memory store for active drivers
-active_drivers = {}
+def observe_upstream_latency(provider, operation, seconds):
+    upstream_latency.observe(seconds, provider=provider, operation=operation)
+
+
+# Driver classes by train mode. Provider libraries (korail2, SRTrain) are
+# imported on first use, so startup does not pay for providers never used.
+DRIVER_CLASSES = {
+    'KTX': ('train_api.korail', 'KorailWrapper'),
+    'SRT': ('train_api.srt', 'SRTWrapper'),
+}
+
+
+def load_driver_class(train_mode: str):
+    if train_mode not in DRIVER_CLASSES:
+        raise ValueError(f"Invalid train mode: {train_mode}")
+    module_name, class_name = DRIVER_CLASSES[train_mode]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_driver(train_mode: str, username: str, password: str):
+    """Builds a (not yet logged-in) driver for the given train mode."""
+    if MOCK_TRAIN_PROVIDER and train_mode in ('KTX', 'SRT'):
+        return MockTrainAPIWrapper(
+            username,
+            password,
+            rate_limiter=rate_limiter,
+            latency_observer=observe_upstream_latency,
+            provider=train_mode,
+            latency=MOCK_LATENCY_SECONDS,
+            jitter=MOCK_LATENCY_JITTER_SECONDS,
+            seat_probability=MOCK_SEAT_PROBABILITY,
+            error_rate=MOCK_ERROR_RATE,
+        )
+    driver_class = load_driver_class(train_mode)
+    return driver_class(username, password, rate_limiter=rate_limiter, latency_observer=observe_upstream_latency)
+
+
+# Pool of logged-in drivers shared by the API handlers and the task workers
+driver_pool = DriverPool(
+    create_driver,
+    max_size=DRIVER_POOL_MAX_SIZE,
+    idle_ttl=DRIVER_IDLE_TTL_SECONDS,
+    session_ttl=DRIVER_SESSION_TTL_SECONDS,
+    refresh_margin=DRIVER_REFRESH_MARGIN_SECONDS,
+)
+
+# --- Metrics ---
+# Hot-path latencies are observed where they happen (see metrics.py); the
+# gauges below mirror component stats and are refreshed on each scrape.
+instrument_database(Engine, SessionLocal)
+
+scheduler_tasks = metrics_registry.gauge("worker_scheduler_tasks", "Tasks in the scheduler queue, by state.", ("state",))
+executor_active = metrics_registry.gauge("worker_executor_active_jobs", "Task cycles running on the executor.")
+driver_pool_size = metrics_registry.gauge("worker_driver_pool_size", "Logged-in drivers in the pool.")
+driver_pool_events = metrics_registry.counter("worker_driver_pool_events_total", "Driver pool logins, failures, refreshes and evictions.", ("event",))
+search_cache_size = metrics_registry.gauge("worker_search_cache_entries", "Entries in the search result cache.")
+search_cache_lookups = metrics_registry.counter("worker_search_cache_lookups_total", "Search cache lookups, by result.", ("result",))
+search_cache_hit_ratio = metrics_registry.gauge("worker_search_cache_hit_ratio", "Share of search cache lookups served from the cache.")
+rate_limit_factor = metrics_registry.gauge("worker_rate_limit_factor", "Current adaptive rate factor per provider (1 = full rate).", ("provider",))
+log_sink_queued = metrics_registry.gauge("worker_log_sink_queued", "Log rows waiting to be written.")
+log_sink_rows = metrics_registry.counter("worker_log_sink_rows_total", "Log rows written or dropped by the log sink.", ("result",))
+notifications = metrics_registry.counter("worker_notifications_total", "Push notifications sent or given up on.", ("result",))
+event_subscribers = metrics_registry.gauge("worker_event_stream_subscribers", "Open task event streams.")
+
 
-def get_driver(account: Account, train_mode: str):
+def collect_runtime_metrics():
+    scheduler_stats = scheduler.stats()
+    for state in ("tasks", "due", "inFlight"):
+        scheduler_tasks.set(scheduler_stats[state], state=state)
+    executor_active.set(executor.stats()["active"])
+
+    pool_stats = driver_pool.stats()
+    driver_pool_size.set(pool_stats["size"])
+    for event in ("logins", "loginFailures", "refreshes", "evictions"):
+        driver_pool_events.set(pool_stats[event], event=event)
+
+    cache_stats = search_cache.stats()
+    search_cache_size.set(cache_stats["size"])
+    for result in ("hits", "misses", "coalesced"):
+        search_cache_lookups.set(cache_stats[result], result=result)
+    search_cache_hit_ratio.set(cache_stats["hitRate"])
+
+    for provider, factor in rate_limiter.stats()["factors"].items():
+        rate_limit_factor.set(factor, provider=provider)
+
+    sink_stats = log_sink.stats()
+    log_sink_queued.set(sink_stats["queued"])
+    log_sink_rows.set(sink_stats["written"], result="written")
+    log_sink_rows.set(sink_stats["dropped"], result="dropped")
+
+    notifier_stats = notification_dispatcher.stats()
+    notifications.set(notifier_stats["sent"], result="sent")
+    notifications.set(notifier_stats["failed"], result="failed")
+    event_subscribers.set(task_events.subscriber_count())
+
+
+metrics_registry.add_collector(collect_runtime_metrics)
+
+
+def get_driver(account: Account, train_mode: str, lane=None):
     """
     Retrieves or creates a logged-in driver instance for a given account.
-    Handles session management.
-    """
-    driver_key = f"{train_mode}-{account.username}"
-    
-    if driver_key not in active_drivers or not active_drivers[driver_key].is_logged_in:
-        logging.info(f"Worker API: Driver not found or not logged in for {train_mode}, {account.username}. Attempting new login.")
-        if train_mode == 'KTX':
-            driver = KorailWrapper(account.username, account.password)
-        elif train_mode == 'SRT':
-            driver = SRTWrapper(account.username, account.password)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid train mode")
+    Session reuse, expiry and re-login are handled by the driver pool.
+    """
+    try:
+        return driver_pool.acquire(train_mode, account.username, account.password, lane=lane)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid train mode")
+    except DriverLoginError:
+        raise HTTPException(status_code=401, detail="Login failed with provided credentials.")
+
+
+# --- Search result conversion ---
+def to_train_result(record, run_date):
+    """Converts a TrainRecord into the API's TrainResult model."""
+    dep_time_label = f"{record.dep_time[:2]}:{record.dep_time[2:]}"
+    # Type and departure time identify the train in trainId; trainNo is the provider's
+    # train number, which the dashboard sends back as selectedTrainNo for TrainIndex.find
+    train_key = f"{record.train_type.split('-')[0]}-{dep_time_label}"
+    return TrainResult(
+        trainNo=str(record.train_no) if record.train_no else train_key,
+        trainType=record.train_type,
+        depTime=record.dep_time,
+        arrTime=record.arr_time,
+        depStation=record.dep_station,
+        arrStation=record.arr_station,
+        isAvailable=record.has_seat,
+        specialSeatAvailable=record.special_seat,
+        generalSeatAvailable=record.general_seat,
+        fare=record.fare,
+        runDate=run_date,
+        trainId=f"{train_key}_{run_date}_{record.dep_time}"
+    )
+
+
+def resolve_route(train_mode, dep_station, arr_station):
+    """Normalizes station names with the station catalog; HTTP 400 for stations the provider does not serve."""
+    try:
+        return station_catalog.resolve_route(train_mode, dep_station, arr_station)
+    except StationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def cached_search(account, request: SearchRequest):
+    """
+    Searches with the account's driver through the short-lived result cache and
+    returns List[TrainResult]. Stations must already be normalized.
+    """
+    def load_results():
+        with span("driver_acquire"):
+            driver = get_driver(account, request.trainMode)
         
-        if driver.login():
-            active_drivers[driver_key] = driver
-            return driver
-        else:
-            raise HTTPException(status_code=401, detail="Login failed with provided credentials.")
-    
-    logging.info(f"Worker API: Using existing logged-in driver for {train_mode}, {account.username}.")
-    return active_drivers[driver_key]
+        logging.info(f"Worker: Calling driver.search with: dep='{request.depStationName}', arr='{request.arrStationName}', date='{request.date}', time_from='{request.timeFrom}'")
+        with span("search"):
+            records = driver.search_records(
+                request.depStationName,
+                request.arrStationName,
+                request.date,
+                request.timeFrom,
+                '235959'
+            )
+        logging.info(f"--- Worker: {len(records)} trains from {type(driver).__name__} ---")
+        return [to_train_result(record, request.date) for record in records]
+
+    # Empty results are not cached: the wrappers also return [] when a search fails
+    return search_cache.get_or_load(
+        search_cache_key(request),
+        load_results,
+        bypass=request.bypassCache,
+        cache_if=bool,
+    )
+
+
+def search_cache_key(request: SearchRequest):
+    return (request.trainMode, request.depStationName, request.arrStationName, request.date, request.timeFrom)
 
 
 # --- API Endpoints ---
+# Handlers that touch the database or a train provider are plain `def`
+# functions: FastAPI runs them on its worker thread pool (sized by
+# API_WORKER_THREADS), so a slow upstream call never blocks the event loop.
 @app.post("/search", response_model=List[TrainResult])
-async def search_trains(request: SearchRequest):
+@profiler.profiled("request")
+def search_trains(request: SearchRequest):
     logging.info(f"--- Worker: Received search request: {request.dict()} ---")
-    db = SessionLocal()
+    # Reject unknown stations before any upstream call; normalized names also share cache entries
+    request.depStationName, request.arrStationName = resolve_route(
+        request.trainMode, request.depStationName, request.arrStationName
+    )
     try:
-        account = db.query(Account).filter(Account.id == request.accountId).first()
+        # Hand the connection back before the (slow) login and upstream search
+        with SessionLocal() as db:
+            with span("db_load"):
+                account = db.query(Account).filter(Account.id == request.accountId).first()
         if not account:
             logging.error(f"Worker: Account not found for ID {request.accountId}")
             raise HTTPException(status_code=404, detail="Account not found.")
 
         logging.info(f"Worker: Found account {account.username} for mode {request.trainMode}")
-        driver = get_driver(account, request.trainMode)
-        
-        logging.info(f"Worker: Calling driver.search with: dep='{request.depStationName}', arr='{request.arrStationName}', date='{request.date}', time_from='{request.timeFrom}'")
-        trains = driver.search(
-            request.depStationName,
-            request.arrStationName,
-            request.date,
-            request.timeFrom,
-            '235959'
-        )
-        logging.info(f"--- Worker: Raw response from train library ({type(driver)}): ---")
-        logging.info(trains)
-        logging.info("--- End of raw response ---")
-
-        formatted_results = []
-        if trains:
-            train_list = trains[0] if trains and isinstance(trains[0], list) else trains
-            for s in train_list:
-                logging.info(f"--- Worker: Processing string: '{s}' ---")
-                try:
-                    # Enhanced regex to handle various train info formats
-                    pattern = re.compile(r"\[(.*?)\]\s+.*?,\s+(.*?)~(?P<arr_station>.*?)\((\d{2}:\d{2})~(\d{2}:\d{2})\)\s+.*?\s*([\d,]+)원")
-                    match = pattern.search(str(s))
-
-                    if match:
-                        train_type, dep_station, arr_station_raw, dep_time, arr_time, fare_str = match.groups()
-                        
-                        # Clean up arr_station name
-                        arr_station = arr_station_raw.strip()
-
-                        fare = float(fare_str.replace(',', ''))
-                        
-                        dep_time_formatted = dep_time.replace(':', '')
-                        arr_time_formatted = arr_time.replace(':', '')
-                        
-                        # Generate a more reliable train number
-                        train_no = f"{train_type.split('-')[0]}-{dep_time}"
-
-                        result = TrainResult(
-                            trainNo=train_no,
-                            trainType=train_type,
-                            depTime=dep_time_formatted,
-                            arrTime=arr_time_formatted,
-                            depStation=dep_station.strip(),
-                            arrStation=arr_station,
-                            isAvailable='매진' not in str(s),
-                            specialSeatAvailable='특실' in str(s) and '매진' not in str(s),
-                            generalSeatAvailable=('일반실' in str(s) or ('특실' not in str(s) and '일반실' not in str(s))) and '매진' not in str(s),
-                            fare=fare,
-                            runDate=request.date,
-                            trainId=f"{train_no}_{request.date}_{dep_time_formatted}"
-                        )
-                        formatted_results.append(result)
-                    else:
-                        logging.warning(f"--- Worker: Failed to parse string with regex: '{s}' ---")
-
-                except Exception as e:
-                    logging.warning(f"--- Worker: Exception while parsing string: '{s}' with error: {e} ---")
+
+        formatted_results = cached_search(account, request)
         
         logging.info(f"--- Worker: Formatted results ({len(formatted_results)} items): ---")
         logging.info(formatted_results)
         logging.info("--- End of formatted results ---")
 
         return formatted_results
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"An error occurred in search_trains: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal server error")
-    finally:
-        db.close()
+
+
+def load_search_account(account_id, train_mode):
+    """Loads the account for a fan-out search and logs its driver in. Raises HTTPException like /search."""
+    with SessionLocal() as db:
+        with span("db_load"):
+            account = db.query(Account).filter(Account.id == account_id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found.")
+    with span("driver_acquire"):
+        get_driver(account, train_mode)
+    return account
+
+
+# Each fan-out search counts as one request for profile captures
+@profiler.profiled("request", name="search_fanout")
+def profiled_cached_search(account, request: SearchRequest):
+    return cached_search(account, request)
+
+
+def format_ndjson(data):
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+@app.post("/search/fanout")
+async def search_trains_fanout(request: FanoutSearchRequest, http_request: Request):
+    """
+    Searches every (date, route) combination concurrently and streams the
+    results as NDJSON, one line per search in the order they complete:
+    {"type": "result", "date", "depStation", "arrStation", "trains": [TrainResult]}
+    or {"type": "error", ..., "message"}, then a final {"type": "done"} summary.
+    Searches go through the /search result cache. At most
+    SEARCH_FANOUT_CONCURRENCY run at once, and each one waits for the
+    provider's and the account's rate limit like any other search.
+    """
+    if not request.dates or not request.routes:
+        raise HTTPException(status_code=400, detail="Give at least one date and one route.")
+    # Normalized routes also collapse spellings of the same route into one search
+    routes = list(dict.fromkeys(
+        resolve_route(request.trainMode, route.depStationName, route.arrStationName) for route in request.routes
+    ))
+    searches = [
+        SearchRequest(
+            accountId=request.accountId,
+            trainMode=request.trainMode,
+            depStationName=dep,
+            arrStationName=arr,
+            date=date,
+            timeFrom=request.timeFrom,
+            bypassCache=request.bypassCache,
+        )
+        for date in dict.fromkeys(request.dates)
+        for dep, arr in routes
+    ]
+    if len(searches) > SEARCH_FANOUT_MAX_SEARCHES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(searches)} searches requested; at most {SEARCH_FANOUT_MAX_SEARCHES} (dates x routes) per request.",
+        )
+    # Fails the request as a whole (404/401) before streaming starts
+    account = await run_in_threadpool(load_search_account, request.accountId, request.trainMode)
+    logging.info(f"--- Worker: Fan-out search of {len(searches)} searches for account {account.username} ---")
+
+    slots = asyncio.Semaphore(max(1, SEARCH_FANOUT_CONCURRENCY))
+
+    async def run_search(search):
+        async with slots:
+            try:
+                trains = await run_in_threadpool(profiled_cached_search, account, search)
+                return search, trains, None
+            except HTTPException as e:
+                return search, None, e.detail
+            except Exception as e:
+                logging.error(f"Worker: Fan-out search {search.depStationName}->{search.arrStationName} on {search.date} failed - {e}")
+                return search, None, "Search failed."
+
+    async def result_stream():
+        started = time.monotonic()
+        pending = [asyncio.ensure_future(run_search(search)) for search in searches]
+        failed = 0
+        try:
+            for next_result in asyncio.as_completed(pending):
+                search, trains, error = await next_result
+                line = {"date": search.date, "depStation": search.depStationName, "arrStation": search.arrStationName}
+                if error is None:
+                    line.update(type="result", trains=[train.dict() for train in trains])
+                else:
+                    failed += 1
+                    line.update(type="error", message=error)
+                yield format_ndjson(line)
+                if await http_request.is_disconnected():
+                    break
+            yield format_ndjson({
+                "type": "done",
+                "searches": len(searches),
+                "failed": failed,
+                "elapsedSeconds": round(time.monotonic() - started, 3),
+            })
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return StreamingResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/stations", response_model=List[str])
+async def list_stations(
+    trainMode: str,
+    q: Optional[str] = Query(None, description="Name prefix; aliases such as 서울역 match too"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """Station names served by a train mode, for autocomplete. All of them when `q` is omitted."""
+    if trainMode not in station_catalog.providers:
+        raise HTTPException(status_code=400, detail="Invalid train mode")
+    if not q:
+        return station_catalog.stations(trainMode)
+    return station_catalog.search(trainMode, q, limit=limit)
+
+
+@app.get("/search/cache")
+async def get_search_cache_stats():
+    return search_cache.stats()
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving. Fails only if startup gave up on the database."""
+    if startup_failed.is_set():
+        raise HTTPException(status_code=503, detail="Startup failed: database not available.")
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the database is reachable and the scheduler loop is running."""
+    if not worker_ready.is_set():
+        raise HTTPException(status_code=503, detail="Worker is starting up.")
+    return {"status": "ready", "workerId": WORKER_ID}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def build_task(request: ReserveRequest, account: Account):
+    """
+    Validates a reservation request against its account and returns the new
+    Task, leased to this worker. Raises HTTPException(400) for a bad request.
+    """
+    has_selected_train = bool(request.selectedTrainType and request.selectedDepTime)
+    if not (has_selected_train or request.candidateTrains or request.timeTo):
+        raise HTTPException(status_code=400, detail="Select a train, candidate trains or a departure window (timeTo).")
+    # The task is polled with the account's provider, so the route must exist there
+    dep_station, arr_station = resolve_route(account.type, request.depStation, request.arrStation)
+    return Task(
+        accountId=request.accountId,
+        depStation=dep_station,
+        arrStation=arr_station,
+        date=request.date,
+        timeFrom=request.timeFrom,
+        timeTo=request.timeTo,
+        passengers=1,
+        interval=max(1, request.interval or DEFAULT_TASK_INTERVAL), # Polling interval for cancellation tickets
+        isActive=True,
+        status="PENDING",
+        selectedTrainNo=request.selectedTrainNo,
+        selectedTrainType=request.selectedTrainType,
+        selectedDepTime=request.selectedDepTime,
+        selectedArrTime=request.selectedArrTime,
+        selectedTrainClass=request.selectedTrainClass,
+        selectedTrainId=request.selectedTrainId,
+        candidateTrains=json.dumps([c.dict() for c in request.candidateTrains], ensure_ascii=False) if request.candidateTrains else None,
+        # Lease the new task to this worker so it can be polled right away
+        leaseOwner=WORKER_ID,
+        leaseExpiresAt=datetime.now() + timedelta(seconds=TASK_LEASE_SECONDS),
+    )
+
+
+def schedule_new_tasks(tasks):
+    """Hands freshly inserted tasks ({task: provider}) to the scheduler so they are polled right away."""
+    metas = {task.id: task_meta(task, provider) for task, provider in tasks.items()}
+    for task_id, meta in metas.items():
+        scheduler.schedule(task_id, meta["interval"], meta=meta)
+    prewarm_hot_drivers(metas, {})
+
+
+class ProfileRequest(BaseModel):
+    target: str = "tick" # "tick": scheduler ticks (one search group each); "request": API requests
+    units: int = 100 # Ticks or requests to capture
+    mode: str = "cprofile" # "cprofile": deterministic profile; "sample": stack sampling
+    sampleIntervalMs: float = 5.0 # Sampling period in "sample" mode
+    maxSeconds: Optional[float] = None # End the capture after this long; PROFILE_MAX_SECONDS if omitted
+
+
+@app.post("/admin/profile")
+async def start_profile(request: ProfileRequest):
+    """
+    Starts profiling the next `units` ticks or requests. Per-stage spans
+    (db_load, driver_acquire, search, match, reserve, log_write) recorded while
+    the capture runs are aggregated with it. Fetch the result from GET /admin/profile.
+    """
+    if not 1 <= request.units <= PROFILE_MAX_UNITS:
+        raise HTTPException(status_code=400, detail=f"units must be between 1 and {PROFILE_MAX_UNITS}.")
+    max_seconds = min(request.maxSeconds or PROFILE_MAX_SECONDS, PROFILE_MAX_SECONDS)
+    try:
+        capture = profiler.start(
+            request.target,
+            request.units,
+            mode=request.mode,
+            sample_interval=max(0.001, request.sampleIntervalMs / 1000),
+            max_seconds=max_seconds,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logging.info(f"Worker: Started profile capture {capture.id} ({request.mode}, {request.units} {request.target}s).")
+    return {"message": "Profile capture started", "captureId": capture.id, "maxSeconds": max_seconds}
+
+
+@app.get("/admin/profile")
+async def get_profile(
+    sort: str = Query("cumulative", description="pstats sort key, e.g. cumulative, tottime, calls"),
+    limit: int = Query(40, ge=1, le=1000, description="Functions (cprofile) or stacks (sample) to list"),
+    format: str = Query("json", description="json, or pstats for the raw merged profile"),
+):
+    """
+    The latest capture, running or finished. `format=pstats` returns the merged
+    cProfile data as a file loadable with pstats.Stats or snakeviz.
+    """
+    capture = profiler.last
+    if capture is None:
+        raise HTTPException(status_code=404, detail="No profile captured yet.")
+    if format == "pstats":
+        data = capture.stats_dump()
+        if data is None:
+            raise HTTPException(status_code=404, detail="The capture has no cProfile data.")
+        return Response(
+            data,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="worker-profile-{capture.id}.prof"'},
+        )
+    try:
+        return capture.summary(sort=sort, limit=limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+
+
+@app.post("/admin/profile/stop")
+async def stop_profile():
+    """Ends the running capture early; its result stays available from GET /admin/profile."""
+    capture = profiler.stop()
+    if capture is None:
+        return {"message": "No profile capture was running."}
+    return {"message": f"Profile capture {capture.id} stopped.", "captureId": capture.id}
 
 
 @app.post("/reserve")
-async def create_reservation_task(request: ReserveRequest, background_tasks: BackgroundTasks):
+@profiler.profiled("request")
+def create_reservation_task(request: ReserveRequest, background_tasks: BackgroundTasks):
     db = SessionLocal()
     try:
         account = db.query(Account).filter(Account.id == request.accountId).first()
         if not account:
             raise HTTPException(status_code=404, detail="Account not found.")
-        
-        new_task = Task(
-            accountId=request.accountId,
-            depStation=request.depStation,
-            arrStation=request.arrStation,
-            date=request.date,
-            timeFrom=request.timeFrom,
-            passengers=1,
-            interval=1, # Polling every 1 second for cancellation tickets
-            isActive=True,
-            status="PENDING",
-            selectedTrainNo=request.selectedTrainNo,
-            selectedTrainType=request.selectedTrainType,
-            selectedDepTime=request.selectedDepTime,
-            selectedArrTime=request.selectedArrTime,
-            selectedTrainClass=request.selectedTrainClass,
-            selectedTrainId=request.selectedTrainId,
-        )
+        new_task = build_task(request, account)
         db.add(new_task)
         db.commit()
         db.refresh(new_task)
+        schedule_new_tasks({new_task: account.type})
         
         return {"message": "Reservation task created successfully", "taskId": new_task.id}
     finally:
         db.close()
 
 
+@app.post("/reserve/batch")
+@profiler.profiled("request")
+def create_reservation_tasks(request: ReserveBatchRequest):
+    """
+    Creates several reservation tasks in one transaction: either every task is
+    inserted or, if any request is invalid, none is. Accounts are loaded in one
+    query. Returns the task ids in request order.
+    """
+    if not request.tasks:
+        raise HTTPException(status_code=400, detail="No tasks given.")
+    if len(request.tasks) > RESERVE_BATCH_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"At most {RESERVE_BATCH_MAX_TASKS} tasks per batch.")
+    # Keep the attributes loaded at commit so scheduling does not reload every task
+    with SessionLocal(expire_on_commit=False) as db:
+        account_ids = {item.accountId for item in request.tasks}
+        accounts = {account.id: account for account in db.query(Account).filter(Account.id.in_(account_ids))}
+        new_tasks = {}
+        for index, item in enumerate(request.tasks):
+            account = accounts.get(item.accountId)
+            if account is None:
+                raise HTTPException(status_code=404, detail=f"tasks[{index}]: Account not found.")
+            try:
+                new_tasks[build_task(item, account)] = account.type
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"tasks[{index}]: {e.detail}")
+        db.add_all(list(new_tasks))
+        db.commit()
+        schedule_new_tasks(new_tasks)
+        logging.info(f"Worker: Created {len(new_tasks)} reservation tasks in one batch.")
+        return {
+            "message": f"{len(new_tasks)} reservation tasks created successfully",
+            "taskIds": [task.id for task in new_tasks],
+        }
+
+
+def parse_id_list(value, name):
+    """Parses a comma-separated list of integer ids from a query parameter."""
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a comma-separated list of integers.")
+
+
+def to_log_model(log, max_chars=None):
+    message = log.message
+    if max_chars and len(message) > max_chars:
+        message = message[:max_chars - 1] + "…"
+    return LogModel(
+        id=log.id,
+        level=log.level,
+        message=message,
+        createdAt=str(log.createdAt),
+        repeatCount=log.repeatCount or 1,
+        lastAt=str(log.lastAt or log.createdAt),
+    )
+
+
+@app.get("/tasks", response_model=List[TaskSummaryModel])
+@profiler.profiled("request")
+def list_tasks(
+    ids: Optional[str] = Query(None, description="Comma-separated task ids"),
+    status: Optional[str] = Query(None, description="Comma-separated statuses, e.g. PENDING,RUNNING"),
+    accountId: Optional[int] = Query(None),
+    logs: int = Query(0, ge=0, le=TASK_LIST_MAX_LOGS, description="Most recent logs to include per task"),
+    messageChars: int = Query(TASK_LIST_LOG_MESSAGE_CHARS, ge=0, description="Truncate log messages to this length; 0 keeps them whole"),
+    limit: int = Query(TASK_LIST_MAX_TASKS, ge=1, le=TASK_LIST_MAX_TASKS),
+):
+    """
+    Summaries of many tasks in one request: one query for the tasks and, with
+    `logs` > 0, one more for their latest logs. Filters combine; without `ids`
+    the newest `limit` tasks matching the other filters are returned.
+    """
+    task_ids = parse_id_list(ids, "ids") if ids else None
+    if task_ids is not None and len(task_ids) > TASK_LIST_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"At most {TASK_LIST_MAX_TASKS} ids per request.")
+    statuses = [part.strip().upper() for part in status.split(",") if part.strip()] if status else None
+    with SessionLocal() as db:
+        query = db.query(Task)
+        if task_ids is not None:
+            query = query.filter(Task.id.in_(task_ids))
+        if statuses:
+            query = query.filter(Task.status.in_(statuses))
+        if accountId is not None:
+            query = query.filter(Task.accountId == accountId)
+        tasks = query.order_by(Task.id.desc()).limit(limit).all()
+        task_logs = load_recent_logs(db, [task.id for task in tasks], logs) if tasks and logs else {}
+        return [
+            TaskSummaryModel(
+                id=task.id,
+                accountId=task.accountId,
+                status=task.status,
+                isActive=task.isActive,
+                depStation=task.depStation,
+                arrStation=task.arrStation,
+                date=task.date,
+                timeFrom=task.timeFrom,
+                selectedTrainType=task.selectedTrainType or "",
+                selectedDepTime=task.selectedDepTime or "",
+                bookedDetail=task.bookedDetail,
+                logs=[to_log_model(log, messageChars) for log in task_logs.get(task.id, [])],
+            )
+            for task in tasks
+        ]
+
+
 @app.get("/tasks/{task_id}", response_model=TaskStatusModel)
-async def get_task_status(task_id: int):
+@profiler.profiled("request")
+def get_task_status(
+    task_id: int,
+    since: Optional[int] = Query(None, description="Only return logs with an id greater than this cursor"),
+    limit: int = Query(LOG_PAGE_DEFAULT_LIMIT, ge=1, le=LOG_PAGE_MAX_LIMIT),
+    updatedSince: Optional[datetime] = Query(None, description="With `since`, also return older logs whose lastAt is later than this cursor"),
+):
+    """
+    Returns the task status with one page of its logs.
+    Without `since` the most recent `limit` logs are returned; with `since` the
+    logs with an id greater than that cursor are returned in id order. Repeats
+    are compacted into existing rows (see LogCompactor), so pass `updatedCursor`
+    back as `updatedSince` to also get the rows at or below `since` whose
+    repeatCount/lastAt changed; clients replace those by id.
+    """
     db = SessionLocal()
     try:
-        logging.info(f"--- Worker: Received request for task status: {task_id} ---")
-        task = db.query(Task).options(joinedload(Task.logs)).filter(Task.id == task_id).first()
+        logging.info(f"--- Worker: Received request for task status: {task_id} (since={since}, updatedSince={updatedSince}, limit={limit}) ---")
+        task = db.query(Task).filter(Task.id == task_id).first()
         if not task:
             logging.warning(f"--- Worker: Task {task_id} not found ---")
             raise HTTPException(status_code=404, detail="Task not found")
-        
-        # Sort logs by creation time (Prisma default is usually ascending)
-        sorted_logs = sorted(task.logs, key=lambda log: log.createdAt)
+
+        # Pages are ordered by id, the cursor. createdAt is not monotonic in id:
+        # rows buffered in the log sink are inserted after a tick's direct writes.
+        log_query = db.query(Log).filter(Log.taskId == task_id)
+        if since is None:
+            page = log_query.order_by(Log.id.desc()).limit(limit).all()
+            page.reverse()
+            has_more = False
+        else:
+            newer = Log.id > since
+            if updatedSince is not None:
+                newer = or_(newer, Log.lastAt > updatedSince)
+            page = log_query.filter(newer).order_by(Log.id).limit(limit + 1).all()
+            has_more = len(page) > limit
+            page = page[:limit]
+
+        # Updated rows sort before new ones, so a truncated page may have left
+        # some out: keep the update cursor where it was until a full page
+        updated_cursor = updatedSince if since is not None else None
+        if not has_more:
+            for log in page:
+                last_at = log.lastAt or log.createdAt
+                if last_at is not None and (updated_cursor is None or last_at > updated_cursor):
+                    updated_cursor = last_at
 
         response_data = TaskStatusModel(
             id=task.id,
@@ -262,7 +1003,10 @@ async def get_task_status(task_id: int):
             arrStation=task.arrStation,
             selectedTrainType=task.selectedTrainType or "",
             selectedDepTime=task.selectedDepTime or "",
-            logs=[LogModel(level=log.level, message=log.message, createdAt=str(log.createdAt)) for log in sorted_logs]
+            logs=[to_log_model(log) for log in page],
+            nextCursor=max([log.id for log in page] + ([since] if since is not None else [])) if page else since,
+            updatedCursor=str(updated_cursor) if updated_cursor is not None else None,
+            hasMore=has_more,
         )
         logging.info(f"--- Worker: Successfully retrieved status for task {task_id} ---")
         return response_data
@@ -276,8 +1020,85 @@ async def get_task_status(task_id: int):
     finally:
         db.close()
 
+def format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/tasks/{task_id}/events")
+async def stream_task_events(task_id: int, request: Request):
+    """
+    Server-Sent Events stream for a task.
+    The first event is a `snapshot` shaped like GET /tasks/{task_id}; after that
+    `status` and `log` events are pushed as this worker produces them. While
+    another worker polls the task, its progress is read from the database every
+    EVENT_STREAM_POLL_SECONDS instead: new and updated log rows arrive as a
+    `logs` event (rows replace earlier entries by id) and status changes as
+    `status` events. The stream ends after the task reaches a final status.
+    """
+    # Subscribe before taking the snapshot so no event falls between the two
+    event_queue = task_events.subscribe(task_id)
+    try:
+        snapshot = await run_in_threadpool(get_task_status, task_id, None, LOG_PAGE_DEFAULT_LIMIT, None)
+    except Exception:
+        task_events.unsubscribe(task_id, event_queue)
+        raise
+
+    async def event_stream():
+        try:
+            yield format_sse("snapshot", snapshot.dict())
+            state = snapshot
+            is_active = snapshot.isActive
+            in_sync = True  # False once log events were pushed that the log cursors do not cover
+            idle_since = time.monotonic()
+            while is_active:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(event_queue.get(), timeout=EVENT_STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if task_id not in scheduler:
+                        if in_sync:
+                            latest = await run_in_threadpool(
+                                get_task_status, task_id, state.nextCursor, LOG_PAGE_MAX_LIMIT,
+                                datetime.fromisoformat(state.updatedCursor) if state.updatedCursor else None,
+                            )
+                            if latest.logs:
+                                yield format_sse("logs", {"type": "logs", "logs": [log.dict() for log in latest.logs]})
+                                idle_since = time.monotonic()
+                        else:
+                            # Rows of the log events already pushed: write them, then only move the cursors past them
+                            await run_in_threadpool(log_sink.flush)
+                            latest = await run_in_threadpool(get_task_status, task_id, None, LOG_PAGE_DEFAULT_LIMIT, None)
+                            in_sync = True
+                        if (latest.status, latest.isActive) != (state.status, state.isActive):
+                            yield format_sse("status", {"type": "status", "status": latest.status, "isActive": latest.isActive})
+                            idle_since = time.monotonic()
+                            is_active = latest.isActive
+                        state = latest
+                    if time.monotonic() - idle_since >= EVENT_STREAM_KEEPALIVE_SECONDS:
+                        yield ": keepalive\n\n"
+                        idle_since = time.monotonic()
+                    continue
+                yield format_sse(event["type"], event)
+                idle_since = time.monotonic()
+                if event["type"] == "log":
+                    in_sync = False
+                elif event["type"] == "status":
+                    state = state.copy(update={"status": event["status"], "isActive": event["isActive"]})
+                    is_active = event["isActive"]
+        finally:
+            task_events.unsubscribe(task_id, event_queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/tasks/{task_id}/cancel")
-async def cancel_task(task_id: int):
+@profiler.profiled("request")
+def cancel_task(task_id: int):
     db = SessionLocal()
     try:
         task = db.query(Task).filter(Task.id == task_id).first()
@@ -288,7 +1109,9 @@ async def cancel_task(task_id: int):
             task.isActive = False
             task.status = "STOPPED"
             db.commit()
+            scheduler.remove(task.id)
             add_log(task.id, "INFO", "Task cancelled by user.")
+            publish_status(task)
             return {"message": f"Task {task_id} cancelled successfully."}
         else:
             return {"message": f"Task {task_id} is not active and cannot be cancelled."}
@@ -296,76 +1119,389 @@ async def cancel_task(task_id: int):
         db.close()
 
 
+def hours_until_departure(departure):
+    """Hours from now until a "YYYYMMDDHHMM" departure (negative once it has left); None if unreadable."""
+    try:
+        departs_at = datetime.strptime(departure, "%Y%m%d%H%M")
+    except (TypeError, ValueError):
+        return None
+    now = datetime.now(timezone.utc) + timedelta(hours=DEPARTURE_UTC_OFFSET_HOURS)
+    return (departs_at - now.replace(tzinfo=None)).total_seconds() / 3600
+
+
+def polling_lane(departure, interval):
+    """
+    Returns (lane, interval) for a task: "hot" with the hot-lane interval when
+    it departs within HOT_LANE_WINDOW_MINUTES, "slow" with a stretched interval
+    when a FAR_TASK_INTERVAL_SCALES tier applies, "normal" otherwise.
+    """
+    interval = max(1, interval or DEFAULT_TASK_INTERVAL)
+    hours = hours_until_departure(departure)
+    if hours is None:
+        return "normal", interval
+    if 0 <= hours <= HOT_LANE_WINDOW_MINUTES / 60:
+        return "hot", min(interval, HOT_LANE_INTERVAL_SECONDS)
+    scale = 1.0
+    for threshold, tier_scale in FAR_TASK_INTERVAL_SCALES:
+        if hours >= threshold:
+            scale = tier_scale
+    return ("slow" if scale > 1 else "normal"), interval * scale
+
+
+def driver_lane(meta):
+    """Driver pool lane for a task: hot-lane tasks get their account's dedicated driver."""
+    return "hot" if (meta or {}).get("lane") == "hot" else None
+
+
+def task_meta(task, provider):
+    """
+    Routing info the scheduler keeps per task: the account and provider used for
+    concurrency caps, the search key used to coalesce identical searches, a
+    sortable departure used to spend the request budget on the soonest trains,
+    and the polling lane and interval that follow from that departure.
+    """
+    departure = f"{task.date}{normalize_time(task.selectedDepTime or task.timeFrom)}"
+    lane, interval = polling_lane(departure, task.interval)
+    return {
+        "accountId": task.accountId,
+        "provider": provider,
+        # Hot-lane tasks search with their own driver, so they only coalesce with each other
+        "searchKey": (provider, task.depStation, task.arrStation, task.date, task.timeFrom, lane == "hot"),
+        "departure": departure,
+        "lane": lane,
+        "interval": interval,
+    }
+
+
+# Logs in hot-lane drivers off the scheduler thread
+driver_prewarm_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="driver-prewarm")
+
+
+def prewarm_driver(account_id, lane):
+    """Logs the account's driver for `lane` in ahead of its first cycle."""
+    with SessionLocal() as db:
+        account = db.query(Account).filter(Account.id == account_id).first()
+    if account is None:
+        return
+    try:
+        driver_pool.acquire(account.type, account.username, account.password, lane=lane)
+        logging.info(f"Worker: Pre-warmed {lane} driver for account {account_id}.")
+    except Exception as e:
+        logging.warning(f"Worker: Could not pre-warm {lane} driver for account {account_id} - {e}")
+
+
+def prewarm_hot_drivers(metas, previous_lanes):
+    """Starts logins for accounts whose tasks just moved into the hot lane."""
+    account_ids = {
+        meta["accountId"] for task_id, meta in metas.items()
+        if meta["lane"] == "hot" and previous_lanes.get(task_id) != "hot"
+    }
+    for account_id in account_ids:
+        driver_prewarm_executor.submit(prewarm_driver, account_id, "hot")
+
+
+def sync_scheduler():
+    """
+    Claims (or renews the lease on) this worker's share of active tasks and
+    reconciles the scheduler with it. Tasks leased to other workers are left to
+    them; tasks whose lease expired are taken over, and tasks released to keep
+    the shares even are dropped from the scheduler.
+    """
+    rows = claim_tasks(WORKER_ID, TASK_LEASE_SECONDS, limit=MAX_CLAIMED_TASKS, batch_size=TASK_CLAIM_BATCH_SIZE)
+    metas = {row.id: task_meta(row, row.type) for row in rows}
+    previous_lanes = {task_id: (scheduler.get_meta(task_id) or {}).get("lane") for task_id in metas}
+    # Lanes are re-evaluated on every sync, so tasks are promoted as their departure approaches
+    scheduler.sync({task_id: meta["interval"] for task_id, meta in metas.items()}, meta=metas)
+    prewarm_hot_drivers(metas, previous_lanes)
+
+
+def search_for_group(task, lane=None):
+    """
+    Runs the upstream search shared by a group of tasks, using the account of
+    `task` (and its driver for `lane`), and returns it as a TrainIndex.
+    Returns None if the search could not be made, in which case each task falls
+    back to its own search.
+    """
+    try:
+        with span("driver_acquire"):
+            driver = get_driver(task.account, task.account.type, lane=lane)
+        with span("search"):
+            return TrainIndex(driver.search_records(task.depStation, task.arrStation, task.date, task.timeFrom, '235959'))
+    except Exception as e:
+        logging.warning(f"Worker: Shared search for task group led by {task.id} failed - {e}")
+        return None
+
+
+def run_task_cycle(task_id: int, task, work, train_index=None):
+    """Runs one cycle of a loaded task, recording its writes in `work`. Returns True if it should keep polling."""
+    if task is None:
+        logging.error(f"Worker: Task {task_id} not found. Dropping from schedule.")
+        return False
+    try:
+        with task_cycle_seconds.time():
+            return process_task(task, work, train_index=train_index, lane=driver_lane(scheduler.get_meta(task_id)))
+    except Exception as e:
+        logging.error(f"Worker: Unhandled error processing task {task_id} - {e}", exc_info=True)
+        return True
+
+
+@profiler.profiled("tick")
+def run_search_group(task_ids):
+    """
+    Runs one tick for a group of tasks watching the same route: loads the
+    tasks in one query, searches once, fans the result out to each task,
+    commits the tick's writes together and re-arms the tasks that keep polling.
+    Every task handed out is re-armed or removed, even if the tick fails:
+    tasks whose outcome is unknown are retried after TASK_ERROR_RETRY_SECONDS.
+    """
+    keep_running = {}
+    failed = False
+    try:
+        with span("db_load"):
+            tasks = load_tasks(task_ids)
+        train_index = None
+        if len(tasks) > 1:
+            leader = tasks.get(task_ids[0]) or next(iter(tasks.values()))
+            train_index = search_for_group(leader, lane=driver_lane(scheduler.get_meta(leader.id)))
+            logging.info(f"Worker: Coalesced search for tasks {task_ids}")
+
+        work = TaskUnitOfWork()
+        for task_id in task_ids:
+            keep_running[task_id] = run_task_cycle(task_id, tasks.get(task_id), work, train_index=train_index)
+            if work.status_of(task_id) == "SUCCESS":
+                # Record a booking before making more upstream calls, so a crash cannot lose it
+                with span("log_write"):
+                    work.commit()
+        with span("log_write"):
+            work.commit()
+    except Exception as e:
+        failed = True
+        logging.error(f"Worker: Tick for tasks {task_ids} failed - {e}", exc_info=True)
+    finally:
+        for task_id in task_ids:
+            if keep_running.get(task_id) is False:
+                scheduler.remove(task_id)
+            elif failed or task_id not in keep_running:
+                scheduler.reschedule(task_id, delay=TASK_ERROR_RETRY_SECONDS)
+            else:
+                # Poll less often while the provider is backing off
+                provider = (scheduler.get_meta(task_id) or {}).get("provider")
+                scheduler.reschedule(task_id, scale=rate_limiter.interval_scale(provider))
+
+
+def dispatch_due_tasks(task_ids):
+    """
+    Groups due tasks by search key and hands each group to the executor,
+    soonest departure first. Groups beyond the provider's current request
+    budget, or whose accounts or provider are at their concurrency cap, are
+    deferred, so scarce budget goes to the trains leaving soonest.
+    """
+    groups = {}
+    for task_id in task_ids:
+        meta = scheduler.get_meta(task_id) or {}
+        key = meta.get("searchKey") or ("task", task_id)
+        groups.setdefault(key, []).append((task_id, meta))
+
+    ordered_groups = sorted(
+        groups.values(),
+        key=lambda members: min(meta.get("departure") or "" for _, meta in members),
+    )
+    budgets = {}
+    for members in ordered_groups:
+        group_task_ids = [task_id for task_id, _ in members]
+        provider = members[0][1].get("provider")
+        if provider not in budgets:
+            budgets[provider] = rate_limiter.budget(provider)
+        if budgets[provider] <= 0:
+            delay = max(TASK_DEFER_SECONDS, rate_limiter.wait_time(provider))
+            for task_id in group_task_ids:
+                scheduler.reschedule(task_id, delay=delay)
+            continue
+
+        # A hot-lane driver is a separate session, so it has its own per-account slot
+        account_ids = {(meta.get("accountId"), driver_lane(meta)) for _, meta in members}
+        future = executor.try_submit(
+            run_search_group,
+            group_task_ids,
+            provider=provider,
+            account_ids=account_ids,
+        )
+        if future is None:
+            for task_id in group_task_ids:
+                scheduler.reschedule(task_id, delay=TASK_DEFER_SECONDS)
+        else:
+            budgets[provider] -= 1
+
+
+# Set when a task notification means the scheduler should re-claim before its next fallback sync
+sync_requested = threading.Event()
+
+
+def on_task_changes(changes):
+    """
+    Handles Task notifications from the listener thread. Finished or cancelled
+    tasks are dropped from the queue right away; new tasks trigger an early
+    sync so they are claimed and polled without waiting for the fallback poll.
+    Status changes are also pushed to this worker's event streams, which may
+    follow a task another worker polls.
+    """
+    needs_sync = False
+    for change in changes:
+        if change.get("op") != "INSERT":
+            task_events.publish(change.get("id"), {
+                "type": "status", "status": change.get("status"), "isActive": change.get("isActive"),
+            })
+        if not change.get("isActive") or change.get("status") not in ("PENDING", "RUNNING"):
+            scheduler.remove(change.get("id"))
+        elif change.get("op") == "INSERT" and change.get("id") not in scheduler:
+            needs_sync = True
+    if needs_sync:
+        sync_requested.set()
+        scheduler.wake()
+
+
+task_listener = TaskChangeListener(SQLALCHEMY_DATABASE_URL, TASK_NOTIFY_CHANNEL, on_task_changes)
+
+
 def main_loop():
-    logging.info("Worker: Starting background polling loop...")
-    while True:
+    logging.info("Worker: Starting background scheduler loop...")
+    next_sync_at = 0.0
+    while not shutdown_requested.is_set():
         try:
-            with SessionLocal() as db: # Use SessionLocal directly as context manager
-                tasks_to_process = db.query(Task).filter(Task.isActive == True, Task.status == "PENDING").all()
-                
-                for task in tasks_to_process:
-                    task.status = "RUNNING"
-                    db.add(task)
-                    db.commit()
-                    db.refresh(task)
-                    
-                    process_task_in_session(task.id) # This function will manage its own session
+            if sync_requested.is_set() or time.monotonic() >= next_sync_at:
+                sync_requested.clear()
+                with scheduler_sync_seconds.time():
+                    sync_scheduler()
+                next_sync_at = time.monotonic() + SCHEDULER_SYNC_SECONDS
+
+            # Sleep until the next task is due or the next sync, whichever comes first
+            due_task_ids = scheduler.wait_for_due(
+                timeout=max(0.0, next_sync_at - time.monotonic()),
+                lookahead=SEARCH_COALESCE_WINDOW,
+            )
+            if due_task_ids and not shutdown_requested.is_set():
+                scheduler_lag_seconds.observe(max(0.0, scheduler.last_lag))
+                with scheduler_tick_seconds.time():
+                    dispatch_due_tasks(due_task_ids)
         except Exception as e:
             logging.error(f"Worker: Error in main loop - {e}", exc_info=True) # Log full traceback
-        
-        time.sleep(1) # Polling interval for background tasks
+            shutdown_requested.wait(1)
+    logging.info("Worker: Scheduler loop stopped.")
 
 
+main_loop_thread = threading.Thread(target=main_loop, name="scheduler", daemon=True)
 
-def process_task_in_session(task_id: int):
-    with SessionLocal() as db:
-        task = db.query(Task).options(joinedload(Task.account)).filter(Task.id == task_id).first()
-        if not task:
-            logging.error(f"Worker: Task {task_id} not found in process_task_in_session.")
-            return
 
+def task_candidates(task):
+    """
+    The trains a task may book, best first, as (trainType, depTime, trainNo).
+    The selected train ranks first, followed by Task.candidateTrains.
+    """
+    candidates = []
+    if task.selectedTrainType and task.selectedDepTime:
+        candidates.append((task.selectedTrainType, task.selectedDepTime, task.selectedTrainNo))
+    if task.candidateTrains:
         try:
-            logging.info(f"\n--- Processing Task ID: {task.id} ({task.account.type}) ---")
+            for candidate in json.loads(task.candidateTrains):
+                candidates.append((candidate.get("trainType"), candidate.get("depTime"), candidate.get("trainNo")))
+        except (ValueError, AttributeError) as e:
+            logging.warning(f"Worker: Ignoring malformed candidateTrains of task {task.id} - {e}")
+    return candidates
+
+
+def describe_train(train_type, dep_time, train_no=None):
+    """Names a train as "KTX 101 at 0900", or "KTX at 0900" without a train number."""
+    return f"{train_type} {train_no} at {dep_time}" if train_no else f"{train_type} at {dep_time}"
+
+
+def describe_targets(task, candidates):
+    if len(candidates) == 1:
+        return f"specific train: {describe_train(*candidates[0])}"
+    if candidates:
+        return f"{len(candidates)} candidate trains"
+    return f"any train departing {task.timeFrom}~{task.timeTo}"
+
+
+def find_bookable_train(task, candidates, train_index):
+    """
+    Returns the best train with a seat in the task's class: the first available
+    candidate, or with no candidates the earliest available train in the
+    departure window. None if nothing is bookable in this search.
+    """
+    seat_class = task.selectedTrainClass
+    if candidates:
+        for train_type, dep_time, train_no in candidates:
+            record = train_index.find(train_type, dep_time, train_no)
+            if record is not None and record.has_seat_in(seat_class):
+                return record
+        return None
+    for record in train_index.departing_between(task.timeFrom, task.timeTo):
+        if record.has_seat_in(seat_class):
+            return record
+    return None
+
+
+def process_task(task, work, train_index=None, lane=None):
+    """
+    Runs one search/reserve attempt for a loaded task, with the account's driver
+    for `lane`. Logs and status changes are recorded in `work` (a
+    TaskUnitOfWork) and written when the tick commits.
+    `train_index` is a search result shared by other tasks on the same route;
+    when it is None the task searches on its own.
+    Returns True if the task should be re-armed for another cycle.
+    """
+    task_id = task.id
+    if not task.isActive or task.status not in ("PENDING", "RUNNING"):
+        logging.info(f"Worker: Task {task_id} is no longer active ({task.status}). Dropping from schedule.")
+        return False
+    if task.leaseOwner != WORKER_ID:
+        logging.info(f"Worker: Task {task_id} is leased to {task.leaseOwner}. Dropping from schedule.")
+        return False
+
+    try:
+        logging.info(f"\n--- Processing Task ID: {task.id} ({task.account.type}) ---")
+        
+        with span("driver_acquire"):
+            driver = get_driver(task.account, task.account.type, lane=lane)
+        
+        candidates = task_candidates(task)
+        if candidates or task.timeTo:
+            work.log(task.id, "INFO", f"Attempting to reserve {describe_targets(task, candidates)} from {task.depStation}")
+            
+            if train_index is None:
+                with span("search"):
+                    train_index = TrainIndex(driver.search_records(task.depStation, task.arrStation, task.date, task.timeFrom, '235959'))
             
-            driver = get_driver(task.account, task.account.type)
+            with span("match"):
+                selected_train = find_bookable_train(task, candidates, train_index)
             
-            if task.selectedTrainId and task.selectedTrainNo:
-                add_log(task.id, "INFO", f"Attempting to reserve specific train: {task.selectedTrainType} {task.selectedTrainNo} from {task.depStation} at {task.selectedDepTime}")
-                
-                trains = driver.search(task.depStation, task.arrStation, task.date, task.timeFrom, '235959')
-                
-                selected_train_obj = None
-                if trains:
-                    train_list = trains[0] if trains and isinstance(trains[0], list) else trains
-                    for train in train_list:
-                        if (train.train_type_name == task.selectedTrainType and
-                            train.dep_time == task.selectedDepTime):
-                            selected_train_obj = train
-                            break
-                
-                if selected_train_obj and selected_train_obj.has_seat():
-                    ticket = driver.reserve(selected_train_obj)
-                    if ticket:
-                        update_task_status(task.id, "SUCCESS", booked_detail=str(ticket))
-                        send_push(f"[{task.account.type}] 예약 성공!", f"{task.depStation}->{task.arrStation} {selected_train_obj.dep_time}")
-                        return
-                    else:
-                        add_log(task.id, "INFO", f"Reservation failed for specific train {task.selectedTrainNo}. Will retry.")
+            if selected_train:
+                with span("reserve"):
+                    ticket = driver.reserve(selected_train.raw, seat_class=task.selectedTrainClass)
+                if ticket:
+                    work.set_status(task.id, "SUCCESS", booked_detail=str(ticket))
+                    send_push(f"[{task.account.type}] 예약 성공!", f"{task.depStation}->{task.arrStation} {selected_train.dep_time}")
+                    return False
                 else:
-                    add_log(task.id, "INFO", f"Selected train {task.selectedTrainNo} not found or no seats available. Will retry search.")
+                    work.log(task.id, "INFO", f"Reservation failed for train {describe_train(selected_train.train_type, selected_train.dep_time, selected_train.train_no)}. Will retry.")
+            elif len(candidates) == 1:
+                work.log(task.id, "INFO", f"Selected train {describe_train(*candidates[0])} not found or no seats available. Will retry search.")
             else:
-                add_log(task.id, "ERROR", "No specific train selected for reservation in task. Marking as failed.")
-                update_task_status(task.id, "FAILED", booked_detail="No specific train to reserve.")
-                return
-            
-            logging.info(f"--- Task ID: {task.id} remains RUNNING for next cycle (retrying) ---")
+                work.log(task.id, "INFO", f"No seats available on {describe_targets(task, candidates)}. Will retry search.")
+        else:
+            work.log(task.id, "ERROR", "No specific train selected for reservation in task. Marking as failed.")
+            work.set_status(task.id, "FAILED", booked_detail="No specific train to reserve.")
+            return False
+        
+        logging.info(f"--- Task ID: {task.id} remains RUNNING for next cycle (retrying) ---")
+        return True
 
-        except HTTPException as e:
-            add_log(task.id, "ERROR", f"Login failed for task {task.id}: {e.detail}")
-            update_task_status(task.id, "FAILED")
-            return
-        except Exception as e:
-            add_log(task.id, "ERROR", f"An unexpected error occurred during reservation attempt: {str(e)}")
-            update_task_status(task.id, "FAILED", booked_detail=f"Error: {str(e)}")
-            logging.error(f"--- Worker: Exception in process_task_in_session for task {task.id}: {e} ---", exc_info=True)
-            return
\ No newline at end of file
+    except HTTPException as e:
+        work.log(task.id, "ERROR", f"Login failed for task {task.id}: {e.detail}")
+        work.set_status(task.id, "FAILED")
+        return False
+    except Exception as e:
+        work.log(task.id, "ERROR", f"An unexpected error occurred during reservation attempt: {str(e)}")
+        work.set_status(task.id, "FAILED", booked_detail=f"Error: {str(e)}")
+        logging.error(f"--- Worker: Exception in process_task for task {task.id}: {e} ---", exc_info=True)
+        return False
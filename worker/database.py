@@ -1,11 +1,16 @@
 # worker/database.py
 import os
-from datetime import datetime
+import math
+import logging
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import create_engine, text, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, or_, and_
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship, joinedload
 from sqlalchemy.sql import func
 
+from log_sink import LogCompactor, LogSink
+from task_events import task_events
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -16,12 +21,35 @@ DB_PASS = os.getenv("DB_PASS", "password")
 DB_NAME = os.getenv("DB_NAME", "traindb")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
-SQLALCHEMY_DATABASE_URL = (
+# WORKER_DATABASE_URL overrides the DB_* settings, e.g. "sqlite:///bench.db" for benchmarks
+SQLALCHEMY_DATABASE_URL = os.getenv("WORKER_DATABASE_URL") or (
     f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# SQLite connections are shared across the worker threads and wait on each other's writes
+ENGINE_CONNECT_ARGS = (
+    {"check_same_thread": False, "timeout": 30}
+    if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+)
+
+# Connection pool sizing. Each task worker holds at most one connection at a
+# time, plus API handlers, the log sink and the scheduler's claim query.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+ENGINE_POOL_ARGS = (
+    {} if SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+    else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+)
+
 # SQLAlchemy setup
-Engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_recycle=3600, pool_pre_ping=True)
+Engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+    connect_args=ENGINE_CONNECT_ARGS,
+    **ENGINE_POOL_ARGS,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=Engine)
 Base = declarative_base()
 
@@ -32,8 +60,9 @@ def wait_for_db(max_tries=20, delay_seconds=3):
     logging.info("Attempting to connect to the database...")
     for i in range(max_tries):
         try:
-            # Try to establish a connection
-            Engine.connect()
+            # Try to establish a connection (and hand it back to the pool)
+            with Engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
             logging.info("Database connection established!")
             return
         except Exception as e:
@@ -74,11 +103,16 @@ class Task(Base):
     selectedArrTime = Column(String, nullable=True)
     selectedTrainClass = Column(String, nullable=True)
     selectedTrainId = Column(String, nullable=True)
+    candidateTrains = Column(String, nullable=True) # JSON list of {trainType, depTime, trainNo}, best first
 
     # Macro settings
     interval = Column(Integer, default=3)
     isActive = Column(Boolean, default=True)
     status = Column(String, nullable=False, default="PENDING") # "PENDING", "RUNNING", "SUCCESS", "FAILED", "STOPPED"
+
+    # Worker lease: the worker that currently polls this task and until when
+    leaseOwner = Column(String, nullable=True)
+    leaseExpiresAt = Column(DateTime, nullable=True)
     
     # Result
     bookedDetail = Column(String, nullable=True)
@@ -94,9 +128,19 @@ class Log(Base):
     taskId = Column(Integer, ForeignKey("Task.id"), nullable=False)
     level = Column(String, nullable=False) # "INFO", "ERROR", "SUCCESS"
     message = Column(String, nullable=False)
-    createdAt = Column(DateTime, server_default=func.now())
+    createdAt = Column(DateTime, server_default=func.now()) # First occurrence
+    repeatCount = Column(Integer, nullable=False, default=1) # Repeats of this message collapsed into this row (see LogCompactor)
+    lastAt = Column(DateTime, server_default=func.now()) # Last occurrence
     task = relationship("Task", back_populates="logs")
 
+    # Matches @@index([taskId, id]) in prisma/schema.prisma; log pages and recent logs are read in id order
+    __table_args__ = (Index("Log_taskId_id_idx", "taskId", "id"),)
+
+class Worker(Base):
+    __tablename__ = "Worker" # Prisma model name is "Worker"
+    id = Column(String, primary_key=True) # WORKER_ID
+    heartbeatAt = Column(DateTime, nullable=False, server_default=func.now()) # Last claim_tasks call
+
 # Helper function to get a DB session
 def get_db():
     db = SessionLocal()
@@ -115,6 +159,134 @@ def get_active_tasks():
     finally:
         db.close()
 
+def claim_tasks(worker_id, lease_seconds, limit=None, batch_size=None):
+    """
+    Leases this worker's share of the active tasks to `worker_id` and returns
+    them with their account type.
+    - Every call records a heartbeat for `worker_id`. Workers with a heartbeat
+      within `lease_seconds` are live, and each holds at most
+      ceil(active tasks / live workers) tasks (and at most `limit`).
+    - Tasks already leased to this worker have their lease extended by a
+      conditional UPDATE (this doubles as the lease heartbeat). A worker
+      holding more than its share releases the surplus, which another replica
+      picks up on its next sync.
+    - Unleased tasks and tasks whose lease expired (crashed workers) are taken
+      over, at most `batch_size` per call, so replicas starting together split
+      the backlog. Rows locked by another worker's claim are skipped, so
+      concurrent workers never lease the same task.
+    Returns every task leased to this worker after the call.
+    """
+    now = datetime.now()
+    claimable = (Task.isActive == True, Task.status.in_(("PENDING", "RUNNING")))
+    with SessionLocal() as db:
+        db.merge(Worker(id=worker_id, heartbeatAt=now))
+        # Rows of workers gone for a while only clutter the table
+        db.query(Worker).filter(Worker.heartbeatAt < now - timedelta(seconds=lease_seconds * 10)).delete(
+            synchronize_session=False
+        )
+        db.flush()
+        live_workers = db.query(func.count(Worker.id)).filter(
+            Worker.heartbeatAt >= now - timedelta(seconds=lease_seconds)
+        ).scalar() or 1
+        share = math.ceil(db.query(func.count(Task.id)).filter(*claimable).scalar() / live_workers)
+        if limit:
+            share = min(share, limit)
+
+        lease = {
+            Task.leaseOwner: worker_id,
+            Task.leaseExpiresAt: now + timedelta(seconds=lease_seconds),
+            Task.status: "RUNNING",
+        }
+        owned = [row.id for row in db.query(Task.id).filter(*claimable, Task.leaseOwner == worker_id).order_by(Task.id)]
+        kept, surplus = owned[:share], owned[share:]
+        if kept:
+            # A plain conditional UPDATE waits for rows another transaction holds
+            # (e.g. a log insert's key share lock) instead of skipping them, so a
+            # briefly locked row never drops out of this worker's schedule
+            db.query(Task).filter(Task.id.in_(kept), Task.leaseOwner == worker_id, *claimable).update(
+                lease, synchronize_session=False
+            )
+        take = share - len(kept)
+        if batch_size:
+            take = min(take, batch_size)
+        if take > 0:
+            # FOR NO KEY UPDATE: conflicts with other claims but not with the
+            # FOR KEY SHARE locks that Log inserts take on their task
+            taken = [row.id for row in db.query(Task.id).filter(
+                *claimable, or_(Task.leaseOwner == None, and_(Task.leaseOwner != worker_id, Task.leaseExpiresAt < now))
+            ).order_by(Task.id).limit(take).with_for_update(skip_locked=True, key_share=True)]
+            if taken:
+                db.query(Task).filter(Task.id.in_(taken)).update(lease, synchronize_session=False)
+        if surplus:
+            db.query(Task).filter(Task.id.in_(surplus), Task.leaseOwner == worker_id).update(
+                {Task.leaseOwner: None, Task.leaseExpiresAt: None},
+                synchronize_session=False,
+            )
+            logging.info(f"DB: Released {len(surplus)} task leases of {worker_id} over its share of {share} ({live_workers} live workers).")
+        rows = db.query(
+            Task.id, Task.interval, Task.accountId, Task.depStation, Task.arrStation,
+            Task.date, Task.timeFrom, Task.selectedDepTime, Account.type,
+        ).join(
+            Account, Task.accountId == Account.id
+        ).filter(*claimable, Task.leaseOwner == worker_id).order_by(Task.id).all()
+        db.commit()
+        return rows
+
+def load_tasks(task_ids):
+    """Loads tasks with their accounts in one query. Returns {task_id: Task}; the objects are detached."""
+    with SessionLocal() as db:
+        tasks = db.query(Task).options(joinedload(Task.account)).filter(Task.id.in_(task_ids)).all()
+        return {task.id: task for task in tasks}
+
+def load_recent_logs(db, task_ids, per_task):
+    """
+    Returns the `per_task` most recent logs of each task in one query as
+    {task_id: [Log, ...]}, in id order like GET /tasks/{id}. Rows are ranked
+    with a window function instead of querying task by task.
+    """
+    rank = func.row_number().over(partition_by=Log.taskId, order_by=Log.id.desc()).label("rank")
+    ranked = db.query(Log.id, rank).filter(Log.taskId.in_(task_ids)).subquery()
+    rows = (
+        db.query(Log)
+        .join(ranked, Log.id == ranked.c.id)
+        .filter(ranked.c.rank <= per_task)
+        .order_by(Log.taskId, Log.id)
+        .all()
+    )
+    logs = {}
+    for log in rows:
+        logs.setdefault(log.taskId, []).append(log)
+    return logs
+
+def prune_finished_task_logs(retention_days, batch_size=5000):
+    """
+    Deletes the logs of tasks that finished (are no longer active) more than
+    `retention_days` days ago, in batches of `batch_size` rows so no single
+    statement holds locks for long. Returns the number of rows deleted.
+    """
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        with SessionLocal() as db:
+            log_ids = [row.id for row in db.query(Log.id).join(Task, Log.taskId == Task.id).filter(
+                Task.isActive == False, Task.updatedAt < cutoff
+            ).limit(batch_size)]
+            if not log_ids:
+                return deleted
+            db.query(Log).filter(Log.id.in_(log_ids)).delete(synchronize_session=False)
+            db.commit()
+        deleted += len(log_ids)
+        if len(log_ids) < batch_size:
+            return deleted
+
+def release_leases(worker_id):
+    """Gives up every lease held by `worker_id` so other workers can claim the tasks immediately."""
+    with SessionLocal() as db:
+        db.query(Task).filter(Task.leaseOwner == worker_id).update(
+            {Task.leaseOwner: None, Task.leaseExpiresAt: None}, synchronize_session=False
+        )
+        db.commit()
+
 def update_task_status(task_id, status, booked_detail=None):
     with SessionLocal() as db: # Use SessionLocal directly as context manager
         try:
@@ -124,10 +296,13 @@ def update_task_status(task_id, status, booked_detail=None):
                 task.bookedDetail = booked_detail
                 if status == "SUCCESS" or status == "FAILED": # Mark as inactive if completed or failed permanently
                     task.isActive = False
+                    task.leaseOwner = None
+                    task.leaseExpiresAt = None
                 task.updatedAt = datetime.now() # Manually update for clarity
                 db.commit()
                 db.refresh(task)
                 print(f"DB: Updated task {task_id} status to {status}. Booked detail: {booked_detail}")
+                publish_status(task)
                 return True
             print(f"DB: Task {task_id} not found for status update.")
             return False
@@ -137,22 +312,116 @@ def update_task_status(task_id, status, booked_detail=None):
             logging.error(f"DB Error in update_task_status (Task {task_id}): {e}", exc_info=True)
             return False
 
+# A log message repeating one of the task's last LOG_COMPACTION_WINDOW distinct
+# messages is stored in that message's row with a repeat count
+log_compactor = LogCompactor(
+    Log,
+    window=int(os.getenv("LOG_COMPACTION_WINDOW", "4")),
+    max_tasks=int(os.getenv("LOG_COMPACTION_MAX_TASKS", "10000")),
+)
+
+# Log rows are buffered and written in batches by a background thread
+log_sink = LogSink(
+    SessionLocal,
+    log_compactor,
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "0.5")),
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+)
+
+def publish_status(task):
+    """Pushes the task's current status to live subscribers (GET /tasks/{id}/events)."""
+    publish_status_values(task.id, task.status, task.isActive, task.bookedDetail)
+
+def publish_status_values(task_id, status, is_active, booked_detail):
+    task_events.publish(task_id, {
+        "type": "status",
+        "status": status,
+        "isActive": is_active,
+        "bookedDetail": booked_detail,
+    })
+
 def add_log(task_id, level, message):
-    with SessionLocal() as db: # Use SessionLocal directly as context manager
-        try:
-            log = Log(taskId=task_id, level=level, message=message)
-            db.add(log)
+    """Queues a Log row for the task. The row is written by the log sink's next flush."""
+    created_at = datetime.now()
+    queued = log_sink.write(task_id, level, message, created_at=created_at)
+    task_events.publish(task_id, {"type": "log", "level": level, "message": message, "createdAt": str(created_at)})
+    print(f"DB Log (Task {task_id}, {level}): {message}")
+    return queued
+
+def create_schema():
+    """
+    Creates any missing tables and indexes from the models.
+    Prisma migrations own the schema, so this is opt-in (CREATE_SCHEMA_ON_STARTUP)
+    and meant for databases Prisma does not manage, such as benchmark SQLite files.
+    """
+    Base.metadata.create_all(Engine)
+
+class TaskUnitOfWork:
+    """
+    Collects the log rows and status transitions of one scheduler tick (a
+    search group) and writes them together on `commit`.
+    - Ticks with status transitions write the transitions and the tick's logs
+      in a single transaction.
+    - Ticks without transitions (the common "no seats, retry" case) hand their
+      logs to the log sink, which batches them with other ticks.
+    Live subscribers get log events right away and status events after commit.
+    """
+
+    def __init__(self):
+        self.logs = []  # Log rows in insertion order
+        self.statuses = {}  # task_id -> (status, booked_detail)
+
+    def log(self, task_id, level, message):
+        created_at = datetime.now()
+        self.logs.append({"taskId": task_id, "level": level, "message": message, "createdAt": created_at})
+        task_events.publish(task_id, {"type": "log", "level": level, "message": message, "createdAt": str(created_at)})
+        print(f"DB Log (Task {task_id}, {level}): {message}")
+
+    def set_status(self, task_id, status, booked_detail=None):
+        self.statuses[task_id] = (status, booked_detail)
+
+    def status_of(self, task_id):
+        """The status recorded for the task in this tick and not committed yet, if any."""
+        return self.statuses.get(task_id, (None, None))[0]
+
+    @staticmethod
+    def _status_values(status, booked_detail, now):
+        values = {Task.status: status, Task.bookedDetail: booked_detail, Task.updatedAt: now}
+        if status == "SUCCESS" or status == "FAILED": # Finished for good: deactivate and release the lease
+            values.update({Task.isActive: False, Task.leaseOwner: None, Task.leaseExpiresAt: None})
+        return values
+
+    def _write(self):
+        now = datetime.now()
+        with SessionLocal() as db:
+            for task_id, (status, booked_detail) in self.statuses.items():
+                db.query(Task).filter(Task.id == task_id).update(
+                    self._status_values(status, booked_detail, now), synchronize_session=False
+                )
+            remember = log_compactor.write(db, self.logs) if self.logs else None
             db.commit()
-            db.refresh(log)
-            print(f"DB Log (Task {task_id}, {level}): {message}")
-            return True
-        except Exception as e:
-            print(f"DB Log Error (Task {task_id}): {e}")
-            import logging
-            logging.error(f"DB Log Error (Task {task_id}): {e}", exc_info=True) # Log full traceback
-            return False
+        if remember is not None:
+            remember()
 
-# For initial setup, we need to ensure tables are created if not using Prisma for Python directly
-# With Prisma managing migrations, we don't need Base.metadata.create_all(Engine) here,
-# but it's good to keep in mind for pure SQLAlchemy projects.
-Base.metadata.create_all(Engine)
\ No newline at end of file
+    def commit(self):
+        """Writes what the tick collected. Falls back to one write per item if the transaction fails."""
+        if not self.statuses:
+            for row in self.logs:
+                log_sink.write(row["taskId"], row["level"], row["message"], created_at=row["createdAt"])
+            self.logs = []
+            return
+
+        try:
+            self._write()
+            for task_id, (status, booked_detail) in self.statuses.items():
+                print(f"DB: Updated task {task_id} status to {status}. Booked detail: {booked_detail}")
+                publish_status_values(task_id, status, status not in ("SUCCESS", "FAILED"), booked_detail)
+        except Exception as e:
+            logging.error(f"DB Error committing task cycle for tasks {list(self.statuses)}: {e}", exc_info=True)
+            for row in self.logs:
+                log_sink.write(row["taskId"], row["level"], row["message"], created_at=row["createdAt"])
+            for task_id, (status, booked_detail) in self.statuses.items():
+                update_task_status(task_id, status, booked_detail=booked_detail)
+        self.logs = []
+        self.statuses = {}
@@ -0,0 +1,193 @@
+# worker/driver_pool.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class DriverLoginError(Exception):
+    """Raised when a driver could not log in with the given credentials."""
+
+
+class PooledDriver:
+    """A logged-in driver plus the bookkeeping the pool needs to expire it."""
+
+    def __init__(self, driver, train_mode, username, password, now):
+        self.driver = driver
+        self.train_mode = train_mode
+        self.username = username
+        self.password = password
+        self.logged_in_at = now
+        self.last_used = now
+
+
+class DriverPool:
+    """
+    Bounded pool of logged-in BaseTrainAPIWrapper instances keyed by train mode,
+    username and lane. A lane (e.g. "hot") gives an account a dedicated driver
+    next to its default one, so latency-sensitive work never queues behind it.
+
+    - Least recently used drivers are evicted past `max_size`, and drivers idle
+      for longer than `idle_ttl` seconds are dropped by the keepalive thread.
+    - Logins are single-flight per key: concurrent callers for the same
+      account wait for one login instead of each opening a session.
+    - Sessions are treated as expiring `session_ttl` seconds after login. The
+      keepalive thread re-logs in drivers that are within `refresh_margin` of
+      expiry, so expired sessions are replaced before they are used.
+    """
+
+    def __init__(self, factory, max_size=64, idle_ttl=1800, session_ttl=1200,
+                 refresh_margin=120, keepalive_interval=30):
+        self._factory = factory  # (train_mode, username, password) -> BaseTrainAPIWrapper
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.session_ttl = session_ttl
+        self.refresh_margin = refresh_margin
+        self.keepalive_interval = keepalive_interval
+        self._entries = OrderedDict()  # key -> PooledDriver, least recently used first
+        self._key_locks = {}  # key -> Lock serializing logins for that key
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.logins = 0
+        self.login_failures = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(train_mode, username, lane=None):
+        key = f"{train_mode}-{username}"
+        return f"{key}-{lane}" if lane else key
+
+    def _usable(self, entry, password, now):
+        return (
+            entry is not None
+            and entry.password == password
+            and entry.driver.is_logged_in
+            and now - entry.logged_in_at < self.session_ttl
+        )
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _login(self, train_mode, username, password):
+        driver = self._factory(train_mode, username, password)
+        if not driver.login():
+            with self._lock:
+                self.login_failures += 1
+            raise DriverLoginError(f"Login failed for {train_mode} account {username}.")
+        with self._lock:
+            self.logins += 1
+        return driver
+
+    def _store(self, key, driver, train_mode, username, password, last_used=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = PooledDriver(driver, train_mode, username, password, now)
+            if last_used is not None:
+                entry.last_used = last_used
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._drop_key_lock(evicted_key)
+                self.evictions += 1
+                logging.info(f"DriverPool: Evicted least recently used driver {evicted_key}.")
+
+    def _drop_key_lock(self, key):
+        key_lock = self._key_locks.get(key)
+        if key_lock is not None and not key_lock.locked():
+            del self._key_locks[key]
+
+    def acquire(self, train_mode, username, password, lane=None):
+        """
+        Returns a logged-in driver for the account (in `lane`, if given),
+        logging in if there is no usable pooled session. Raises
+        DriverLoginError if the login fails.
+        """
+        key = self.make_key(train_mode, username, lane)
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._usable(entry, password, time.monotonic()):
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry.driver
+
+        with self._key_lock(key):
+            # Another caller may have finished the login while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if self._usable(entry, password, time.monotonic()):
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(key)
+                    return entry.driver
+            logging.info(f"DriverPool: No usable session for {key}. Attempting new login.")
+            driver = self._login(train_mode, username, password)
+            self._store(key, driver, train_mode, username, password)
+            return driver
+
+    def invalidate(self, train_mode, username, lane=None):
+        with self._lock:
+            self._entries.pop(self.make_key(train_mode, username, lane), None)
+
+    def maintain(self):
+        """Drops idle drivers and re-logs in sessions that are about to expire."""
+        now = time.monotonic()
+        to_refresh = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry.last_used > self.idle_ttl:
+                    del self._entries[key]
+                    self._drop_key_lock(key)
+                    self.evictions += 1
+                    logging.info(f"DriverPool: Evicted idle driver {key}.")
+                elif now - entry.logged_in_at >= self.session_ttl - self.refresh_margin:
+                    to_refresh.append((key, entry))
+
+        for key, entry in to_refresh:
+            key_lock = self._key_lock(key)
+            if not key_lock.acquire(blocking=False):
+                continue  # A login for this key is already in progress
+            try:
+                driver = self._login(entry.train_mode, entry.username, entry.password)
+                # Keep the idle clock of the old session so refreshes do not keep unused drivers alive
+                self._store(key, driver, entry.train_mode, entry.username, entry.password, last_used=entry.last_used)
+                with self._lock:
+                    self.refreshes += 1
+                logging.info(f"DriverPool: Refreshed session for {key} ahead of expiry.")
+            except Exception as e:
+                logging.warning(f"DriverPool: Proactive re-login failed for {key} - {e}")
+            finally:
+                key_lock.release()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                logging.error(f"DriverPool: Error in keepalive loop - {e}", exc_info=True)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._keepalive_loop, name="driver-keepalive", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "logins": self.logins,
+                "loginFailures": self.login_failures,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,98 @@
+# worker/executor.py
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_limits(value, cast=int):
+    """Parses a "KTX=4,SRT=2" style string into {"KTX": 4, "SRT": 2}."""
+    limits = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        key, limit = item.split("=", 1)
+        try:
+            limits[key.strip()] = cast(limit)
+        except ValueError:
+            logging.warning(f"Executor: Ignoring invalid limit '{item}'")
+    return limits
+
+
+class TaskExecutor:
+    """
+    Bounded thread pool for task cycles.
+    Besides the global worker count, it caps how many jobs may run at once for
+    the same account and for the same provider (KTX/SRT). Admission is
+    non-blocking: `try_submit` returns None when a cap is reached so the caller
+    can defer the job instead of parking a pool thread on it.
+    """
+
+    def __init__(self, max_workers=6, per_account_limit=1, per_provider_limit=4, provider_limits=None):
+        self.max_workers = max_workers
+        self.per_account_limit = per_account_limit
+        self.per_provider_limit = per_provider_limit
+        self.provider_limits = provider_limits or {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task-worker")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._account_active = Counter()
+        self._provider_active = Counter()
+
+    def _provider_limit(self, provider):
+        return self.provider_limits.get(provider, self.per_provider_limit)
+
+    def _admit(self, provider, account_ids):
+        if self._active >= self.max_workers:
+            return False
+        if self._provider_active[provider] >= self._provider_limit(provider):
+            return False
+        for account_id in account_ids:
+            if self._account_active[account_id] >= self.per_account_limit:
+                return False
+        self._active += 1
+        self._provider_active[provider] += 1
+        for account_id in account_ids:
+            self._account_active[account_id] += 1
+        return True
+
+    def _release(self, provider, account_ids):
+        with self._lock:
+            self._active -= 1
+            self._provider_active[provider] -= 1
+            if self._provider_active[provider] <= 0:
+                del self._provider_active[provider]
+            for account_id in account_ids:
+                self._account_active[account_id] -= 1
+                if self._account_active[account_id] <= 0:
+                    del self._account_active[account_id]
+
+    def try_submit(self, fn, *args, provider, account_ids=()):
+        """
+        Runs `fn(*args)` on the pool if the provider and every account in
+        `account_ids` are under their caps. Returns the Future, or None if the
+        job was not admitted.
+        """
+        account_ids = tuple(account_ids)
+        with self._lock:
+            if not self._admit(provider, account_ids):
+                return None
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._release(provider, account_ids)
+            raise
+        future.add_done_callback(lambda _: self._release(provider, account_ids))
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "maxWorkers": self.max_workers,
+                "byProvider": dict(self._provider_active),
+                "byAccount": dict(self._account_active),
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,231 @@
+# worker/log_sink.py
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, update
+
+
+class LogCompactor:
+    """
+    Run-length compaction of task logs. A message (same level and text) that
+    repeats one of the task's last `window` distinct messages is stored in
+    that message's Log row: its repeatCount grows and its lastAt moves
+    forward, with createdAt kept as the first occurrence. Matching against a
+    window rather than only the last row also collapses cycles that log
+    several lines per attempt ("Attempting ...", "No seats ... Will retry"),
+    so a task that keeps retrying holds a bounded number of rows.
+    Remembers the recent rows per task (for up to `max_tasks` tasks, least
+    recently written dropped first), so a repeat arriving in a later batch
+    becomes an UPDATE of an existing row instead of a new one.
+    """
+
+    def __init__(self, model, window=4, max_tasks=10000):
+        self._table = model.__table__
+        self.window = window
+        self.max_tasks = max_tasks
+        self._recent = OrderedDict()  # task_id -> [(log_id, level, message)], least recently seen first
+        self._lock = threading.Lock()
+        self.collapsed = 0
+
+    def write(self, db, rows):
+        """
+        Writes `rows` ({taskId, level, message, createdAt}, oldest first) in
+        the session's current transaction. Returns a callback that must be
+        called after the commit to remember the rows just written.
+        """
+        table = self._table
+        with self._lock:
+            # Per task: [{"id": log id or None while pending, "key": (level, message), "row": pending insert}]
+            recent = {
+                row["taskId"]: [
+                    {"id": log_id, "key": (level, message), "row": None}
+                    for log_id, level, message in self._recent.get(row["taskId"], ())
+                ]
+                for row in rows
+            }
+
+        inserts = []
+        repeats = {}  # log_id -> {"logId", "repeats", "lastSeenAt"}
+        for row in rows:
+            entries = recent[row["taskId"]]
+            key = (row["level"], row["message"])
+            match = next((entry for entry in entries if entry["key"] == key), None)
+            if match is None:
+                new_row = dict(row, repeatCount=1, lastAt=row["createdAt"])
+                inserts.append(new_row)
+                entries.append({"id": None, "key": key, "row": new_row})
+                del entries[:-self.window]
+                continue
+            # Most recently seen last, so the window keeps the messages of the current cycle
+            entries.remove(match)
+            entries.append(match)
+            if match["row"] is not None:
+                match["row"]["repeatCount"] += 1
+                match["row"]["lastAt"] = row["createdAt"]
+            else:
+                repeat = repeats.setdefault(match["id"], {"logId": match["id"], "repeats": 0, "lastSeenAt": None})
+                repeat["repeats"] += 1
+                repeat["lastSeenAt"] = row["createdAt"]
+
+        if repeats:
+            db.execute(
+                update(table).where(table.c.id == bindparam("logId")).values(
+                    repeatCount=table.c.repeatCount + bindparam("repeats"),
+                    lastAt=bindparam("lastSeenAt"),
+                ),
+                list(repeats.values()),
+            )
+        if inserts:
+            result = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), inserts)
+            inserted_ids = {id(new_row): row.id for new_row, row in zip(inserts, result)}
+            for entries in recent.values():
+                for entry in entries:
+                    if entry["row"] is not None:
+                        entry["id"] = inserted_ids[id(entry["row"])]
+
+        def remember():
+            with self._lock:
+                for task_id, entries in recent.items():
+                    self._recent[task_id] = [(entry["id"], *entry["key"]) for entry in entries]
+                    self._recent.move_to_end(task_id)
+                while len(self._recent) > self.max_tasks:
+                    self._recent.popitem(last=False)
+                self.collapsed += len(rows) - len(inserts)
+
+        return remember
+
+
+class LogSink:
+    """
+    In-process buffer for task Log rows.
+    Writers enqueue rows and return immediately; a background thread flushes
+    them through the LogCompactor once `batch_size` rows are waiting or
+    `flush_interval` seconds have passed. The queue is bounded: when it is full,
+    writers block for up to `put_timeout` seconds before the row is dropped.
+    Pending rows are flushed when the sink is stopped and at interpreter exit.
+    """
+
+    def __init__(self, session_factory, compactor, batch_size=200, flush_interval=0.5,
+                 max_queue=10000, put_timeout=2.0):
+        self._session_factory = session_factory
+        self._compactor = compactor
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._atexit_registered = False
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def write(self, task_id, level, message, created_at=None):
+        """Queues a log row. Returns False if it had to be dropped because the queue stayed full."""
+        self.start()
+        row = {"taskId": task_id, "level": level, "message": message, "createdAt": created_at or datetime.now()}
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"LogSink: Queue full, dropped log for task {task_id}: {message}")
+            return False
+
+    def _drain(self, limit):
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _insert(self, rows):
+        with self._session_factory() as db:
+            remember = self._compactor.write(db, rows)
+            db.commit()
+        remember()
+
+    def _write_batch(self, rows):
+        try:
+            self._insert(rows)
+        except Exception as e:
+            logging.error(f"LogSink: Failed to write {len(rows)} log rows, retrying once - {e}")
+            try:
+                self._insert(rows)
+            except Exception as e:
+                self.dropped += len(rows)
+                logging.error(f"LogSink: Dropped {len(rows)} log rows - {e}", exc_info=True)
+                return
+        self.written += len(rows)
+        self.flushes += 1
+
+    def flush(self):
+        """
+        Writes every queued row now, after the batch the flusher thread is
+        collecting (if any) has been written. Safe to call from any thread.
+        """
+        with self._flush_lock:
+            while True:
+                rows = self._drain(self.batch_size)
+                if not rows:
+                    return
+                self._write_batch(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Rows are taken off the queue only under the lock, so flush() waits for them to be written
+            with self._flush_lock:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                # Collect more rows until the batch is full or the flush interval runs out
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and not self._stop.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._write_batch(batch)
+        self.flush()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self, timeout=5.0):
+        """Stops the flusher thread and writes whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "collapsed": self._compactor.collapsed,
+        }
@@ -0,0 +1,231 @@
+# worker/metrics.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for latency histograms: sub-millisecond DB calls up to slow provider calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric with a fixed set of label names; one series per label combination."""
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values tuple -> value (or histogram state)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: tuple(map(str, item[0])))
+            lines.extend(self._render_series(series))
+        return lines
+
+    def _render_series(self, series):
+        for key, value in series:
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """For collectors mirroring a count kept elsewhere (e.g. cache hits)."""
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram as Prometheus expects (`_bucket`, `_sum`, `_count`)."""
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, series):
+        for key, state in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, [("le", format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {format_value(state['sum'])}"
+            yield f"{self.name}_count{labels} {state['count']}"
+
+
+class MetricsRegistry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+    Collectors are callables run before each render; they copy values that
+    live elsewhere (pool sizes, cache stats) into gauges, so the hot path only
+    pays for metrics it observes directly.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics)
+        for collector in collectors:
+            collector()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+upstream_latency = registry.histogram(
+    "worker_upstream_request_seconds",
+    "Latency of train provider calls.",
+    ("provider", "operation"),
+)
+scheduler_tick_seconds = registry.histogram(
+    "worker_scheduler_tick_seconds",
+    "Time spent dispatching one batch of due tasks.",
+)
+scheduler_sync_seconds = registry.histogram(
+    "worker_scheduler_sync_seconds",
+    "Time spent claiming tasks and reconciling the scheduler.",
+)
+scheduler_lag_seconds = registry.histogram(
+    "worker_scheduler_lag_seconds",
+    "How late the earliest task of a batch was handed out, relative to its due time.",
+)
+task_cycle_seconds = registry.histogram(
+    "worker_task_cycle_seconds",
+    "Duration of one search/reserve cycle of a task.",
+)
+stage_seconds = registry.histogram(
+    "worker_stage_seconds",
+    "Duration of the stages of task ticks and search requests (see profiling.span).",
+    ("stage",),
+)
+db_query_seconds = registry.histogram(
+    "worker_db_query_seconds",
+    "Duration of SQL statements, by statement verb.",
+    ("statement",),
+)
+db_session_seconds = registry.histogram(
+    "worker_db_session_seconds",
+    "Duration of database transactions opened through SessionLocal.",
+)
+
+
+def instrument_database(engine, session_factory):
+    """Times every SQL statement on `engine` and every transaction of sessions from `session_factory`."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_seconds.observe(time.perf_counter() - started, statement=verb)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+    @event.listens_for(session_factory, "after_begin")
+    def after_begin(session, transaction, connection):
+        session.info.setdefault("transaction_started", time.perf_counter())
+
+    @event.listens_for(session_factory, "after_transaction_end")
+    def after_transaction_end(session, transaction):
+        if transaction.parent is None and "transaction_started" in session.info:
+            db_session_seconds.observe(time.perf_counter() - session.info.pop("transaction_started"))
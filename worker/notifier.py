@@ -1,25 +1,185 @@
 # worker/notifier.py
+import atexit
+import heapq
+import itertools
 import os
+import queue
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+class NotificationDispatcher:
+    """
+    Delivers push notifications via ntfy on a background thread so callers
+    never wait on the push server.
+
+    - One pooled requests.Session is reused for every delivery, with a timeout.
+    - Notifications queued within `coalesce_window` seconds of each other that
+      share a title are sent as a single push with the messages joined.
+    - Failed deliveries go to a retry queue and are re-sent with exponential
+      backoff, up to `max_retries` times, without blocking newer notifications.
+    """
+
+    def __init__(self, timeout=5.0, max_retries=3, backoff_seconds=2.0,
+                 coalesce_window=1.0, max_queue=1000):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.coalesce_window = coalesce_window
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = []  # heap of (ready_at, seq, attempt, title, message)
+        self._seq = itertools.count()
+        self._session = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._atexit_registered = False
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    def _get_session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def submit(self, title, message):
+        """Queues a notification. Returns False if the queue is full and it was dropped."""
+        self.start()
+        try:
+            self._queue.put_nowait((title, message))
+            return True
+        except queue.Full:
+            self.failed += 1
+            print(f"NTFY: Queue full, dropped notification - Title: '{title}'")
+            return False
+
+    def _deliver(self, title, message):
+        ntfy_url = os.getenv("NTFY_URL")
+        if not ntfy_url:
+            print("NTFY: NTFY_URL not set. Skipping push notification.")
+            return True
+        try:
+            response = self._get_session().post(
+                ntfy_url,
+                data=message.encode('utf-8'),
+                headers={
+                    "Title": title.encode('utf-8'),
+                    "Priority": "high",
+                    "Tags": "tada"
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            print(f"NTFY: Successfully sent push notification - Title: '{title}', Message: '{message}'")
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"NTFY: Failed to send push notification - {e}")
+            return False
+
+    def _send(self, attempt, title, message):
+        if self._deliver(title, message):
+            self.sent += 1
+        elif attempt < self.max_retries:
+            ready_at = time.monotonic() + self.backoff_seconds * (2 ** attempt)
+            heapq.heappush(self._retries, (ready_at, next(self._seq), attempt + 1, title, message))
+        else:
+            self.failed += 1
+            print(f"NTFY: Giving up on notification after {attempt + 1} attempts - Title: '{title}'")
+
+    def _collect(self, first):
+        """Gathers notifications arriving within the coalesce window and merges them by title."""
+        batch = [first]
+        deadline = time.monotonic() + self.coalesce_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        merged = {}
+        for title, message in batch:
+            merged.setdefault(title, []).append(message)
+        self.coalesced += len(batch) - len(merged)
+        return [(title, "\n".join(messages)) for title, messages in merged.items()]
+
+    def _send_due_retries(self):
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now:
+            _, _, attempt, title, message = heapq.heappop(self._retries)
+            self._send(attempt, title, message)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._send_due_retries()
+            wait = 1.0
+            if self._retries:
+                wait = min(wait, max(0.0, self._retries[0][0] - time.monotonic()))
+            try:
+                first = self._queue.get(timeout=wait)
+            except queue.Empty:
+                continue
+            for title, message in self._collect(first):
+                self._send(0, title, message)
+        self._drain()
+
+    def _drain(self):
+        """Sends whatever is still queued once, without waiting for retries."""
+        while True:
+            try:
+                title, message = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if self._deliver(title, message):
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self, timeout=10.0):
+        """Stops the dispatcher after delivering what is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "retrying": len(self._retries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+        }
+
+
+dispatcher = NotificationDispatcher(
+    timeout=float(os.getenv("NTFY_TIMEOUT", "5")),
+    max_retries=int(os.getenv("NTFY_MAX_RETRIES", "3")),
+    coalesce_window=float(os.getenv("NTFY_COALESCE_WINDOW", "1")),
+)
+
 
 def send_push(title, message):
-    """Sends a push notification via ntfy."""
-    ntfy_url = os.getenv("NTFY_URL")
-    if not ntfy_url:
-        print("NTFY: NTFY_URL not set. Skipping push notification.")
-        return
-
-    try:
-        response = requests.post(
-            ntfy_url,
-            data=message.encode('utf-8'),
-            headers={
-                "Title": title.encode('utf-8'),
-                "Priority": "high",
-                "Tags": "tada"
-            }
-        )
-        response.raise_for_status()
-        print(f"NTFY: Successfully sent push notification - Title: '{title}', Message: '{message}'")
-    except requests.exceptions.RequestException as e:
-        print(f"NTFY: Failed to send push notification - {e}")
\ No newline at end of file
+    """Queues a push notification via ntfy. Delivery happens on the dispatcher thread."""
+    dispatcher.submit(title, message)
@@ -0,0 +1,293 @@
+# worker/profiling.py
+import cProfile
+import functools
+import io
+import itertools
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from metrics import stage_seconds
+
+# What a capture can profile: scheduler ticks (one search group each) or API requests
+PROFILE_TARGETS = ("tick", "request")
+PROFILE_MODES = ("cprofile", "sample")
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a capture is started while another one is still running."""
+
+
+@contextmanager
+def span(stage):
+    """
+    Times one stage of a task tick or request (db_load, driver_acquire, search,
+    match, reserve, log_write). Always observed by the stage histogram; also
+    aggregated into the running capture, if any.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        capture = profiler.active
+        if capture is not None:
+            capture.add_span(stage, elapsed)
+
+
+class ProfileCapture:
+    """
+    One profiling run over the next `units` ticks or requests.
+
+    In "cprofile" mode each unit runs under its own cProfile.Profile (profilers
+    are per thread) and the finished profiles are merged into one pstats.Stats.
+    In "sample" mode a background thread samples the stacks of threads that are
+    inside a captured unit every `sample_interval` seconds and counts them as
+    folded stacks. The capture also ends after `max_seconds`, so it cannot stay
+    armed forever when no unit arrives.
+    """
+
+    def __init__(self, capture_id, target, units, mode="cprofile", sample_interval=0.005, max_seconds=300.0):
+        self.id = capture_id
+        self.target = target
+        self.units = units
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + max_seconds
+        self.finished_at = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._claimed = 0
+        self._completed = 0
+        self._skipped = 0  # Units whose profiler could not be enabled (another profiler active on the thread)
+        self._stats = None  # pstats.Stats merged from finished units
+        self._samples = Counter()  # folded stack -> samples
+        self._sample_count = 0
+        self._threads = {}  # thread id -> unit name, for threads inside a captured unit
+        self._spans = {}  # stage -> [count, total seconds, max seconds]
+        if mode == "sample":
+            threading.Thread(target=self._sample_loop, name=f"profile-sampler-{capture_id}", daemon=True).start()
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def claim(self):
+        """Reserves a slot for one unit. False once the capture has all its units or ran out of time."""
+        with self._lock:
+            if self.done.is_set() or self._claimed >= self.units:
+                return False
+            if self.expired:
+                self._finish()
+                return False
+            self._claimed += 1
+            return True
+
+    def add_span(self, stage, seconds):
+        if self.done.is_set():
+            return
+        with self._lock:
+            totals = self._spans.setdefault(stage, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+    def _complete(self, profile=None):
+        with self._lock:
+            if profile is not None:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+            self._completed += 1
+            if self._completed >= self.units:
+                self._finish()
+
+    def _finish(self):
+        if not self.done.is_set():
+            self.finished_at = time.time()
+            self.done.set()
+
+    def stop(self):
+        with self._lock:
+            self._finish()
+
+    @contextmanager
+    def run_unit(self, name):
+        """Profiles the body as one unit of this capture, on the calling thread."""
+        thread_id = threading.get_ident()
+        profile = None
+        if self.mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None
+                with self._lock:
+                    self._skipped += 1
+        else:
+            with self._lock:
+                self._threads[thread_id] = name
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                self._threads.pop(thread_id, None)
+            self._complete(profile)
+
+    def _sample_loop(self):
+        while not self.done.wait(self.sample_interval):
+            if self.expired:
+                self.stop()
+                break
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, name in threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    self._samples[self._fold(name, frame)] += 1
+                    self._sample_count += 1
+
+    @staticmethod
+    def _fold(name, frame):
+        """Collapses a stack into "unit;outer (file:line);...;inner (file:line)", the flamegraph folded format."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack.append(name)
+        return ";".join(reversed(stack))
+
+    def stats_dump(self):
+        """The merged profile in the format of pstats.Stats.dump_stats (loadable by pstats, snakeviz, ...)."""
+        with self._lock:
+            return marshal.dumps(self._stats.stats) if self._stats is not None else None
+
+    def summary(self, sort="cumulative", limit=40):
+        if not self.done.is_set() and self.expired:
+            self.stop()
+        with self._lock:
+            spans = {
+                stage: {
+                    "count": count,
+                    "totalSeconds": round(total, 6),
+                    "meanSeconds": round(total / count, 6) if count else 0.0,
+                    "maxSeconds": round(longest, 6),
+                }
+                for stage, (count, total, longest) in sorted(self._spans.items())
+            }
+            result = {
+                "id": self.id,
+                "target": self.target,
+                "mode": self.mode,
+                "state": "done" if self.done.is_set() else "running",
+                "units": self.units,
+                "unitsCaptured": self._completed,
+                "unitsSkipped": self._skipped,
+                "startedAt": self.started_at,
+                "finishedAt": self.finished_at,
+                "spans": spans,
+            }
+            if self.mode == "cprofile":
+                result["profile"] = self._format_stats(sort, limit)
+            else:
+                result["samples"] = self._sample_count
+                result["sampleIntervalSeconds"] = self.sample_interval
+                result["stacks"] = [
+                    {"stack": stack, "samples": count} for stack, count in self._samples.most_common(limit)
+                ]
+            return result
+
+    def _format_stats(self, sort, limit):
+        if self._stats is None:
+            return ""
+        output = io.StringIO()
+        self._stats.stream = output
+        self._stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+class Profiler:
+    """
+    Entry point for on-demand profiling. At most one capture runs at a time;
+    the last one is kept for retrieval until the next one starts. Code paths
+    mark their units with `unit(target, name)` (or the `profiled` decorator),
+    which costs one attribute read while no capture is running.
+    """
+
+    def __init__(self):
+        self.active = None  # Running capture, read without the lock on the hot path
+        self.last = None  # Most recent capture, running or finished
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, target, units, mode="cprofile", sample_interval=0.005, max_seconds=300.0):
+        if target not in PROFILE_TARGETS:
+            raise ValueError(f"target must be one of {', '.join(PROFILE_TARGETS)}")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        with self._lock:
+            if self.active is not None and not self.active.done.is_set() and not self.active.expired:
+                raise ProfilerBusy(f"Capture {self.active.id} is still running.")
+            if self.active is not None:
+                self.active.stop()
+            capture = ProfileCapture(next(self._ids), target, units, mode, sample_interval, max_seconds)
+            self.active = self.last = capture
+            return capture
+
+    def stop(self):
+        """Ends the running capture early. Returns it, or None if none was running."""
+        with self._lock:
+            capture, self.active = self.active, None
+        if capture is not None:
+            capture.stop()
+        return capture
+
+    @contextmanager
+    def unit(self, target, name):
+        capture = self.active
+        if capture is None or capture.target != target or not capture.claim():
+            if capture is not None and capture.done.is_set():
+                self._release(capture)
+            yield
+            return
+        try:
+            with capture.run_unit(name):
+                yield
+        finally:
+            if capture.done.is_set():
+                self._release(capture)
+
+    def _release(self, capture):
+        with self._lock:
+            if self.active is capture:
+                self.active = None
+
+    def profiled(self, target, name=None):
+        """Decorator form of `unit` for sync functions; keeps the signature FastAPI inspects."""
+        def decorate(func):
+            unit_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.unit(target, unit_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+
+profiler = Profiler()
@@ -0,0 +1,159 @@
+# worker/rate_limiter.py
+import threading
+import time
+
+# Substrings in provider errors that indicate we are being throttled rather
+# than failing for some other reason
+THROTTLE_MARKERS = ("429", "too many", "잠시 후", "과도한", "비정상적인 접근")
+
+
+def is_throttle_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens
+
+    def wait_time(self, now, tokens=1):
+        """Seconds until `tokens` tokens will be available."""
+        self._refill(now)
+        missing = tokens - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, tokens=1):
+        self.tokens -= tokens
+
+
+class AdaptiveRateLimiter:
+    """
+    Token buckets per provider and per account, shared by search and reserve.
+    Each provider's rate is scaled by a factor that backs off multiplicatively
+    on errors and throttle responses and recovers additively on success (AIMD).
+    The same factor stretches task polling intervals, so polling slows down
+    together with the request budget.
+    """
+
+    def __init__(self, provider_rates=None, default_provider_rate=5.0, account_rate=2.0,
+                 burst_seconds=2.0, min_factor=0.1, error_decrease=0.8,
+                 throttle_decrease=0.5, recovery_step=0.05):
+        self.provider_rates = provider_rates or {}
+        self.default_provider_rate = default_provider_rate
+        self.account_rate = account_rate
+        self.burst_seconds = burst_seconds
+        self.min_factor = min_factor
+        self.error_decrease = error_decrease
+        self.throttle_decrease = throttle_decrease
+        self.recovery_step = recovery_step
+        self._lock = threading.Condition()
+        self._provider_buckets = {}
+        self._account_buckets = {}
+        self._factors = {}  # provider -> current rate factor in [min_factor, 1]
+        self.throttled = 0
+        self.errors = 0
+        self.waits = 0
+
+    def _base_rate(self, provider):
+        return self.provider_rates.get(provider, self.default_provider_rate)
+
+    def _bucket(self, buckets, key, rate):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, max(1.0, rate * self.burst_seconds))
+        return bucket
+
+    def _provider_bucket(self, provider):
+        rate = self._base_rate(provider) * self._factors.get(provider, 1.0)
+        bucket = self._bucket(self._provider_buckets, provider, rate)
+        bucket.rate = rate
+        return bucket
+
+    def _account_bucket(self, provider, account):
+        return self._bucket(self._account_buckets, (provider, account), self.account_rate)
+
+    def acquire(self, provider, account=None, timeout=5.0):
+        """
+        Takes one token from the provider bucket and, if given, the account
+        bucket, waiting up to `timeout` seconds. Returns False on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                provider_bucket = self._provider_bucket(provider)
+                wait = provider_bucket.wait_time(now)
+                if account is not None:
+                    account_bucket = self._account_bucket(provider, account)
+                    wait = max(wait, account_bucket.wait_time(now))
+                if wait <= 0:
+                    provider_bucket.take()
+                    if account is not None:
+                        account_bucket.take()
+                    return True
+                if now + wait > deadline:
+                    return False
+                self.waits += 1
+                self._lock.wait(wait)
+
+    def budget(self, provider):
+        """Whole provider tokens available right now (not consumed)."""
+        with self._lock:
+            return int(self._provider_bucket(provider).available(time.monotonic()))
+
+    def wait_time(self, provider, tokens=1):
+        with self._lock:
+            return self._provider_bucket(provider).wait_time(time.monotonic(), tokens)
+
+    def record_success(self, provider):
+        with self._lock:
+            factor = self._factors.get(provider, 1.0)
+            if factor < 1.0:
+                self._factors[provider] = min(1.0, factor + self.recovery_step)
+
+    def record_failure(self, provider, error=None, backoff_on_error=True):
+        """
+        Backs the provider off; harder if `error` looks like a throttle response.
+        With `backoff_on_error=False` only throttle responses back off (for calls
+        such as reserve whose ordinary failures say nothing about load).
+        """
+        throttled = error is not None and is_throttle_error(error)
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+            else:
+                self.errors += 1
+                if not backoff_on_error:
+                    return
+            decrease = self.throttle_decrease if throttled else self.error_decrease
+            factor = self._factors.get(provider, 1.0)
+            self._factors[provider] = max(self.min_factor, factor * decrease)
+
+    def interval_scale(self, provider):
+        """How much to stretch polling intervals for `provider` (1.0 when healthy)."""
+        with self._lock:
+            return 1.0 / self._factors.get(provider, 1.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "factors": dict(self._factors),
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "waits": self.waits,
+            }
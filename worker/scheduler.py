@@ -0,0 +1,174 @@
+# worker/scheduler.py
+import heapq
+import itertools
+import threading
+import time
+
+
+class TaskScheduler:
+    """
+    Keeps active tasks in a due-time priority queue.
+    Each task is re-armed by its own interval after it runs, and callers only
+    wake up when the earliest task is due, so the cost of a tick is proportional
+    to the number of due tasks rather than the number of active ones.
+    """
+
+    def __init__(self, default_interval=3, min_interval=1):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self._heap = []  # (due_at, seq, task_id); stale entries are skipped lazily
+        self._due = {}  # task_id -> due_at of the live heap entry
+        self._intervals = {}  # task_id -> polling interval in seconds
+        self._in_flight = set()  # task_ids handed out and not yet re-armed
+        self._meta = {}  # task_id -> caller-defined routing info (account, provider, ...)
+        self._seq = itertools.count()
+        self._woken = False
+        self._cond = threading.Condition()
+        self.last_lag = 0.0  # How late the first task of the last batch was handed out, in seconds
+
+    def _interval_for(self, interval):
+        if not interval or interval <= 0:
+            interval = self.default_interval
+        return max(interval, self.min_interval)
+
+    def _push(self, task_id, due_at):
+        self._due[task_id] = due_at
+        heapq.heappush(self._heap, (due_at, next(self._seq), task_id))
+
+    def schedule(self, task_id, interval=None, delay=0.0, meta=None):
+        """Adds a task (or updates its interval) and arms it to run after `delay` seconds."""
+        with self._cond:
+            self._intervals[task_id] = self._interval_for(interval)
+            if meta is not None:
+                self._meta[task_id] = meta
+            if task_id in self._in_flight:
+                return
+            due_at = time.monotonic() + delay
+            if task_id not in self._due or due_at < self._due[task_id]:
+                self._push(task_id, due_at)
+                self._cond.notify()
+
+    def reschedule(self, task_id, delay=None, scale=1.0):
+        """
+        Re-arms a task that was handed out by `wait_for_due`.
+        Defaults to the task's own interval multiplied by `scale`. Tasks removed
+        while they were running are not re-armed.
+        """
+        with self._cond:
+            self._in_flight.discard(task_id)
+            if task_id not in self._intervals:
+                return
+            if delay is None:
+                delay = self._intervals[task_id] * scale
+            self._push(task_id, time.monotonic() + delay)
+            self._cond.notify()
+
+    def remove(self, task_id):
+        with self._cond:
+            self._intervals.pop(task_id, None)
+            self._due.pop(task_id, None)
+            self._meta.pop(task_id, None)
+            self._in_flight.discard(task_id)
+
+    def sync(self, active_intervals, meta=None):
+        """
+        Reconciles the queue with the authoritative set of active tasks
+        ({task_id: interval}). New tasks are due immediately; tasks that are no
+        longer active are dropped.
+        """
+        with self._cond:
+            for task_id in list(self._intervals):
+                if task_id not in active_intervals:
+                    self._intervals.pop(task_id, None)
+                    self._due.pop(task_id, None)
+                    self._meta.pop(task_id, None)
+            if meta:
+                self._meta.update(meta)
+            now = time.monotonic()
+            added = False
+            for task_id, interval in active_intervals.items():
+                self._intervals[task_id] = self._interval_for(interval)
+                if task_id not in self._due and task_id not in self._in_flight:
+                    self._push(task_id, now)
+                    added = True
+            if added:
+                self._cond.notify()
+
+    def get_meta(self, task_id):
+        with self._cond:
+            return self._meta.get(task_id)
+
+    def wake(self):
+        """Interrupts a pending `wait_for_due` call."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def next_due_in(self):
+        """Seconds until the earliest task is due, or None if the queue is empty."""
+        with self._cond:
+            self._drop_stale()
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def _drop_stale(self):
+        while self._heap:
+            due_at, _, task_id = self._heap[0]
+            if self._due.get(task_id) == due_at:
+                return
+            heapq.heappop(self._heap)
+
+    def wait_for_due(self, timeout=None, lookahead=0.0):
+        """
+        Blocks until at least one task is due (or `timeout` elapses) and returns
+        the due task ids in due order. Tasks falling due within `lookahead`
+        seconds are handed out in the same batch so they can share work.
+        Returned tasks are considered in flight until they are passed back to
+        `reschedule` or `remove`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._drop_stale()
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                if self._woken:
+                    self._woken = False
+                    return []
+                wait_for = None if deadline is None else deadline - now
+                if self._heap:
+                    until_due = self._heap[0][0] - now
+                    wait_for = until_due if wait_for is None else min(wait_for, until_due)
+                if wait_for is not None and wait_for <= 0:
+                    return []
+                self._cond.wait(wait_for)
+
+            self.last_lag = now - self._heap[0][0]
+            due = []
+            while self._heap and self._heap[0][0] <= now + lookahead:
+                due_at, _, task_id = heapq.heappop(self._heap)
+                if self._due.get(task_id) != due_at:
+                    continue
+                del self._due[task_id]
+                self._in_flight.add(task_id)
+                due.append(task_id)
+            return due
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "tasks": len(self._intervals),
+                "due": sum(1 for due_at in self._due.values() if due_at <= now),
+                "inFlight": len(self._in_flight),
+            }
+
+    def __len__(self):
+        with self._cond:
+            return len(self._intervals)
+
+    def __contains__(self, task_id):
+        with self._cond:
+            return task_id in self._intervals
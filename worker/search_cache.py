@@ -0,0 +1,109 @@
+# worker/search_cache.py
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class SearchCache:
+    """
+    Bounded, short-TTL cache for parsed search results.
+    Concurrent lookups of the same missing key share a single upstream call
+    (single-flight): the first caller loads, the others wait for its result.
+    Failed loads are never cached and are re-raised to every waiter.
+    """
+
+    def __init__(self, ttl_seconds=5.0, max_entries=256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._inflight = {}  # key -> Future shared by concurrent loaders
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def _get_fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key, loader, bypass=False, cache_if=None):
+        """
+        Returns the cached value for `key`, or calls `loader()` to produce it.
+        With `bypass=True` the cache is not read, but the fresh value still
+        replaces the cached one. `cache_if(value)` may veto storing a result.
+        """
+        with self._lock:
+            if not bypass:
+                entry = self._get_fresh(key, time.monotonic())
+                if entry is not None:
+                    self.hits += 1
+                    return entry[1]
+                follow = self._inflight.get(key)
+                if follow is not None:
+                    self.coalesced += 1
+            else:
+                follow = None
+            if follow is None:
+                self.misses += 1
+                future = Future()
+                if not bypass:
+                    self._inflight[key] = future
+
+        if follow is not None:
+            return follow.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if cache_if is None or cache_if(value):
+                self._store(key, value, time.monotonic())
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                # Coalesced lookups also avoided their own upstream call
+                "hitRate": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+            }
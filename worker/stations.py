@@ -0,0 +1,142 @@
+# worker/stations.py
+import bisect
+import re
+import threading
+
+# Main Korail stations, for autocomplete. korail2 searches any Korail station by
+# name, so KTX routes are not limited to this list (see OPEN_PROVIDERS).
+# Keep in sync with KTX_STATIONS in lib/constants.ts.
+KTX_STATIONS = (
+    "서울", "용산", "영등포", "수원", "광명", "천안아산", "오송", "대전", "서대전",
+    "김천(구미)", "구미", "동대구", "서대구", "경산", "밀양", "구포", "부산", "신경주",
+    "울산(통도사)", "포항", "행신", "계룡", "논산", "익산", "정읍", "광주송정", "나주",
+    "목포", "전주", "남원", "순천", "여수EXPO", "여천", "진주", "마산", "창원", "창원중앙",
+    "진영", "강릉", "진부", "평창", "둔내", "횡성", "양평", "공주",
+)
+
+
+def srt_stations():
+    """Every station SRTrain has a station code for. Imports SRTrain, so it runs on the first SRT lookup."""
+    from SRT.constants import STATION_CODE
+    return tuple(STATION_CODE)
+
+
+# Providers that accept stations outside their catalog; unknown names are passed
+# through (cleaned) and the provider's own search rejects stations that do not exist
+OPEN_PROVIDERS = ("KTX",)
+
+# Other common spellings -> catalog name. A trailing "역" and spaces are dropped before lookup.
+STATION_ALIASES = {
+    "김천구미": "김천(구미)",
+    "울산": "울산(통도사)",
+    "울산통도사": "울산(통도사)",
+    "통도사": "울산(통도사)",
+    "여수엑스포": "여수EXPO",
+    "여수": "여수EXPO",
+    "지제": "평택지제",
+    "진부(오대산)": "진부",
+    "진부오대산": "진부",
+}
+
+STATION_SUFFIX = re.compile(r"역$")
+
+
+class StationError(ValueError):
+    """Raised for a station or route the provider does not serve."""
+
+
+class StationCatalog:
+    """
+    In-memory station catalog per provider (train mode).
+    Names are normalized (whitespace and a trailing "역" dropped, aliases
+    resolved, Latin letters upper-cased) so "서울역" and "서울" are the same
+    station. Prefix lookups bisect a sorted list of names and aliases.
+    A provider's names may come from a function, called on first use, and
+    providers in `open_providers` also accept names outside their catalog.
+    """
+
+    def __init__(self, stations_by_provider, aliases=None, open_providers=()):
+        self._sources = dict(stations_by_provider)  # provider -> names, or a function returning them
+        self._aliases = {self._clean(alias): name for alias, name in (aliases or {}).items()}
+        self._open = frozenset(open_providers)
+        self._catalogs = {}  # provider -> (names, lookup key -> name, sorted [(lookup key, name)]), built on first use
+        self._lock = threading.Lock()
+
+    def _catalog(self, provider):
+        catalog = self._catalogs.get(provider)
+        if catalog is None:
+            with self._lock:
+                catalog = self._catalogs.get(provider)
+                if catalog is None:
+                    source = self._sources[provider]
+                    names = frozenset(source() if callable(source) else source)
+                    lookup = {alias: name for alias, name in self._aliases.items() if name in names}
+                    lookup.update((self._clean(name), name) for name in names)
+                    catalog = self._catalogs[provider] = (names, lookup, sorted(lookup.items()))
+        return catalog
+
+    @staticmethod
+    def _clean(name):
+        cleaned = re.sub(r"\s+", "", name or "").upper()
+        # "서울역" -> "서울", but keep names that are only "역"
+        return STATION_SUFFIX.sub("", cleaned) or cleaned
+
+    @property
+    def providers(self):
+        return tuple(self._sources)
+
+    def stations(self, provider):
+        """Catalog names served by `provider`, sorted."""
+        if provider not in self._sources:
+            return []
+        return sorted(self._catalog(provider)[0])
+
+    def normalize(self, provider, name):
+        """
+        Returns the catalog name for `name` on `provider`, or None if the
+        provider does not serve it. Open providers return unknown names cleaned.
+        """
+        if provider not in self._sources:
+            return None
+        key = self._clean(name)
+        station = self._catalog(provider)[1].get(key)
+        if station is None and provider in self._open and key:
+            return key
+        return station
+
+    def resolve_route(self, provider, dep_station, arr_station):
+        """
+        Normalizes both ends of a route. Raises StationError if the provider is
+        unknown, does not serve either station, or both ends are the same.
+        """
+        if provider not in self._sources:
+            raise StationError(f"Unknown train mode: {provider}")
+        dep = self.normalize(provider, dep_station)
+        if dep is None:
+            raise StationError(f"{provider} does not serve departure station '{dep_station}'.")
+        arr = self.normalize(provider, arr_station)
+        if arr is None:
+            raise StationError(f"{provider} does not serve arrival station '{arr_station}'.")
+        if dep == arr:
+            raise StationError(f"Departure and arrival station are the same ('{dep}').")
+        return dep, arr
+
+    def search(self, provider, prefix, limit=10):
+        """Catalog names on `provider` whose name or alias starts with `prefix`, in lookup-key order."""
+        if provider not in self._sources:
+            return []
+        index = self._catalog(provider)[2]
+        key = self._clean(prefix)
+        results = []
+        position = bisect.bisect_left(index, (key, ""))
+        while position < len(index) and len(results) < limit:
+            lookup_key, name = index[position]
+            if not lookup_key.startswith(key):
+                break
+            if name not in results:
+                results.append(name)
+            position += 1
+        return results
+
+
+station_catalog = StationCatalog({"KTX": KTX_STATIONS, "SRT": srt_stations}, STATION_ALIASES, OPEN_PROVIDERS)
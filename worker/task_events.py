@@ -0,0 +1,58 @@
+# worker/task_events.py
+import asyncio
+import threading
+
+
+class TaskEventBus:
+    """
+    Fans task status changes and log lines out to live subscribers.
+    Publishers may run on any thread (worker pool, log writers); each
+    subscriber is an asyncio.Queue owned by the event loop serving its stream,
+    and events are handed over with `call_soon_threadsafe`. Slow subscribers
+    lose their oldest events rather than growing without bound.
+    """
+
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self._subscribers = {}  # task_id -> set of (loop, queue)
+        self._lock = threading.Lock()
+
+    def subscribe(self, task_id):
+        """Registers a subscriber on the running event loop and returns its queue."""
+        loop = asyncio.get_running_loop()
+        event_queue = asyncio.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add((loop, event_queue))
+        return event_queue
+
+    def unsubscribe(self, task_id, event_queue):
+        with self._lock:
+            subscribers = self._subscribers.get(task_id)
+            if not subscribers:
+                return
+            subscribers.difference_update({sub for sub in subscribers if sub[1] is event_queue})
+            if not subscribers:
+                del self._subscribers[task_id]
+
+    @staticmethod
+    def _offer(event_queue, event):
+        if event_queue.full():
+            event_queue.get_nowait()
+        event_queue.put_nowait(event)
+
+    def publish(self, task_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for loop, event_queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, event_queue, event)
+            except RuntimeError:
+                # The subscriber's loop is closed; it will never read again
+                self.unsubscribe(task_id, event_queue)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+task_events = TaskEventBus()
@@ -0,0 +1,74 @@
+# worker/task_listener.py
+import json
+import logging
+import select
+import threading
+
+
+class TaskChangeListener:
+    """
+    Listens on a Postgres NOTIFY channel for Task changes and forwards the
+    decoded payloads to `on_change`. The channel is fed by the
+    `Task_notify_change` trigger (see prisma/migrations), which sends
+    {"id", "op", "status", "isActive"} on insert and on status/isActive changes.
+    Reconnects with backoff if the connection drops.
+    """
+
+    def __init__(self, dsn, channel, on_change, poll_timeout=5.0, max_backoff=30.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.on_change = on_change
+        self.poll_timeout = poll_timeout
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread = None
+        self.connected = False
+        self.notifications = 0
+
+    def _listen(self):
+        import psycopg2  # Only needed when the listener is enabled
+
+        conn = psycopg2.connect(self.dsn)
+        try:
+            conn.set_session(autocommit=True)
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}";')
+            self.connected = True
+            logging.info(f"TaskListener: Listening for task changes on '{self.channel}'.")
+            while not self._stop.is_set():
+                if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                changes = []
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        changes.append(json.loads(notify.payload))
+                    except ValueError:
+                        logging.warning(f"TaskListener: Ignoring malformed payload '{notify.payload}'")
+                if changes:
+                    self.notifications += len(changes)
+                    self.on_change(changes)
+        finally:
+            self.connected = False
+            conn.close()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._listen()
+                backoff = 1.0
+            except Exception as e:
+                logging.warning(f"TaskListener: Connection lost, retrying in {backoff:.0f}s - {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="task-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
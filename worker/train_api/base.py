@@ -1,10 +1,142 @@
+import re
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Fare as printed by the train libraries, e.g. "59,800원"
+FARE_PATTERN = re.compile(r"([\d,]+)원")
+
+# Seat classes as stored in Task.selectedTrainClass; None means either class
+SEAT_CLASS_GENERAL = "일반실"
+SEAT_CLASS_SPECIAL = "특실"
+
+
+def normalize_time(value):
+    """Normalizes "HH:MM", "HHMM" or "HHMMSS" to "HHMM"."""
+    return (value or "").replace(":", "")[:4]
+
+
+class TrainRecord:
+    """
+    Provider-independent view of one train from a search result.
+    Built from the library object's attributes; `raw` keeps the original object
+    because the libraries need it to reserve.
+    """
+    __slots__ = (
+        "train_type", "train_no", "dep_station", "arr_station", "dep_date",
+        "dep_time", "arr_time", "general_seat", "special_seat", "fare", "raw",
+    )
+
+    def __init__(self, train_type, train_no, dep_station, arr_station, dep_date,
+                 dep_time, arr_time, general_seat, special_seat, fare=0.0, raw=None):
+        self.train_type = train_type
+        self.train_no = train_no
+        self.dep_station = dep_station
+        self.arr_station = arr_station
+        self.dep_date = dep_date
+        self.dep_time = normalize_time(dep_time)  # HHMM
+        self.arr_time = normalize_time(arr_time)  # HHMM
+        self.general_seat = general_seat
+        self.special_seat = special_seat
+        self.fare = fare
+        self.raw = raw
+
+    @property
+    def has_seat(self):
+        return self.general_seat or self.special_seat
+
+    def has_seat_in(self, seat_class=None):
+        """Whether a seat is available in `seat_class` (any class if None)."""
+        if seat_class == SEAT_CLASS_SPECIAL:
+            return self.special_seat
+        if seat_class == SEAT_CLASS_GENERAL:
+            return self.general_seat
+        return self.has_seat
+
+    def __repr__(self):
+        return (f"TrainRecord({self.train_type} {self.train_no} {self.dep_station}~{self.arr_station} "
+                f"{self.dep_time}~{self.arr_time} general={self.general_seat} special={self.special_seat})")
+
+
+class TrainIndex:
+    """
+    Search result indexed for constant-time matching.
+    Trains are keyed by (train type, dep time) and by (train type, dep time,
+    train no); dep times are compared as HHMM.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._by_departure = {}
+        self._by_train_no = {}
+        for record in records:
+            self._by_departure.setdefault((record.train_type, record.dep_time), record)
+            self._by_train_no[(record.train_type, record.dep_time, record.train_no)] = record
+
+    def find(self, train_type, dep_time, train_no=None):
+        dep_time = normalize_time(dep_time)
+        if train_no:
+            record = self._by_train_no.get((train_type, dep_time, train_no))
+            if record is not None:
+                return record
+        return self._by_departure.get((train_type, dep_time))
+
+    def departing_between(self, time_from, time_to):
+        """Trains departing within [time_from, time_to], earliest first."""
+        time_from, time_to = normalize_time(time_from), normalize_time(time_to)
+        return sorted(
+            (record for record in self.records if time_from <= record.dep_time <= time_to),
+            key=lambda record: record.dep_time,
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+def parse_fare(train):
+    """Reads the fare from the library's text form; 0.0 if it does not print one."""
+    match = FARE_PATTERN.search(str(train))
+    return float(match.group(1).replace(",", "")) if match else 0.0
+
 
 class BaseTrainAPIWrapper(ABC):
-    def __init__(self, username, password):
+    provider = None  # Train mode served by the wrapper ("KTX" / "SRT")
+    rate_limit_wait = 5.0  # Seconds to wait for request budget before giving up
+
+    def __init__(self, username, password, rate_limiter=None, latency_observer=None):
         self.username = username
         self.password = password
         self.is_logged_in = False
+        self.rate_limiter = rate_limiter
+        self.latency_observer = latency_observer  # (provider, operation, seconds) -> None
+
+    @contextmanager
+    def _upstream_call(self, operation):
+        """Times one provider call ("login", "search", "reserve") for the latency observer, failed calls included."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.latency_observer is not None:
+                self.latency_observer(self.provider, operation, time.perf_counter() - started)
+
+    def _acquire_budget(self):
+        """Waits for a provider/account token. Returns False if none came within rate_limit_wait."""
+        if self.rate_limiter is None:
+            return True
+        return self.rate_limiter.acquire(self.provider, self.username, timeout=self.rate_limit_wait)
+
+    def _report_result(self, error=None, backoff_on_error=True):
+        """Feeds the outcome of an upstream call back into the adaptive rate limiter."""
+        if self.rate_limiter is None:
+            return
+        if error is None:
+            self.rate_limiter.record_success(self.provider)
+        else:
+            self.rate_limiter.record_failure(self.provider, error, backoff_on_error=backoff_on_error)
 
     @abstractmethod
     def login(self):
@@ -23,21 +155,45 @@ class BaseTrainAPIWrapper(ABC):
         pass
 
     @abstractmethod
-    def reserve(self, train):
+    def reserve(self, train, seat_class=None):
         """
-        Attempts to reserve a seat on the given train.
+        Attempts to reserve a seat on the given train, restricted to
+        `seat_class` (SEAT_CLASS_GENERAL / SEAT_CLASS_SPECIAL) if given.
         Returns a ticket object on success, None on failure.
         """
         pass
 
+    @abstractmethod
+    def to_record(self, train):
+        """Converts one library train object into a TrainRecord."""
+        pass
+
+    def search_records(self, dep_station, arr_station, date, time_from, time_to):
+        """Searches like `search` and returns the trains as TrainRecords."""
+        trains = self.search(dep_station, arr_station, date, time_from, time_to)
+        if trains and isinstance(trains[0], list):
+            trains = trains[0]
+        records = []
+        for train in trains or []:
+            try:
+                records.append(self.to_record(train))
+            except Exception as e:
+                print(f"{type(self).__name__}: Skipping unreadable train {train!r} - {e}")
+        return records
+
 class MockTrain:
     """A mock train object for testing purposes."""
-    def __init__(self, dep, arr, time, has_seat=True, type="KTX"):
+    def __init__(self, dep, arr, time, has_seat=True, type="KTX",
+                 train_no=None, date=None, arr_time=None, special_seat=False):
         self.dep = dep
         self.arr = arr
         self.time = time
         self._has_seat = has_seat
         self.type = type
+        self.train_no = train_no
+        self.date = date
+        self.arr_time = arr_time
+        self.special_seat = special_seat
 
     def has_seat(self):
         return self._has_seat
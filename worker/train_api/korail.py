@@ -1,15 +1,25 @@
 # worker/train_api/korail.py
-from korail2 import Korail
-from .base import BaseTrainAPIWrapper, MockTrain, MockTicket
+from korail2 import Korail, ReserveOption, NoResultsError
+from .base import BaseTrainAPIWrapper, MockTrain, MockTicket, TrainRecord, parse_fare, SEAT_CLASS_GENERAL, SEAT_CLASS_SPECIAL
+
+RESERVE_OPTIONS = {
+    None: ReserveOption.GENERAL_FIRST,
+    SEAT_CLASS_GENERAL: ReserveOption.GENERAL_ONLY,
+    SEAT_CLASS_SPECIAL: ReserveOption.SPECIAL_ONLY,
+}
 
 class KorailWrapper(BaseTrainAPIWrapper):
-    def __init__(self, username, password):
-        super().__init__(username, password)
+    provider = "KTX"
+
+    def __init__(self, username, password, rate_limiter=None, latency_observer=None):
+        super().__init__(username, password, rate_limiter=rate_limiter, latency_observer=latency_observer)
         self.korail = Korail(username, password)
 
     def login(self):
         try:
-            if self.korail.login():
+            with self._upstream_call("login"):
+                logged_in = self.korail.login()
+            if logged_in:
                 self.is_logged_in = True
                 print("Korail: Login successful.")
                 return True
@@ -23,28 +33,61 @@ class KorailWrapper(BaseTrainAPIWrapper):
         if not self.is_logged_in:
             print("Korail: Not logged in. Cannot search.")
             return []
+        if not self._acquire_budget():
+            print("Korail: Request budget exhausted. Skipping search.")
+            return []
         
         try:
-            trains = self.korail.search_train(dep_station, arr_station, date, time_from, include_no_seats=True)
+            with self._upstream_call("search"):
+                trains = self.korail.search_train(dep_station, arr_station, date, time_from, include_no_seats=True)
             print(f"Korail: Found {len(trains)} trains.")
+            self._report_result()
             return trains
+        except NoResultsError:
+            # korail2 raises when no train runs in the window; the call itself succeeded
+            print("Korail: Found 0 trains.")
+            self._report_result()
+            return []
         except Exception as e:
             print(f"Korail: Search failed - {e}")
+            self._report_result(e)
             import traceback
             traceback.print_exc()
             return []
 
-    def reserve(self, train):
+    def reserve(self, train, seat_class=None):
         if not self.is_logged_in:
             print("Korail: Not logged in. Cannot reserve.")
             return None
+        if not self._acquire_budget():
+            print("Korail: Request budget exhausted. Skipping reservation.")
+            return None
         
         try:
-            ticket = self.korail.reserve(train)
+            with self._upstream_call("reserve"):
+                ticket = self.korail.reserve(train, option=RESERVE_OPTIONS.get(seat_class, ReserveOption.GENERAL_FIRST))
+            self._report_result()
             if ticket:
                 print(f"Korail: Successfully reserved {ticket}")
                 return ticket
         except Exception as e:
             print(f"Korail: Reservation failed - {e}")
+            # Sold-out and similar errors are expected here; only throttling should slow us down
+            self._report_result(e, backoff_on_error=False)
+
+        return None
 
-        return None
\ No newline at end of file
+    def to_record(self, train):
+        return TrainRecord(
+            train_type=train.train_type_name,
+            train_no=train.train_no,
+            dep_station=train.dep_name,
+            arr_station=train.arr_name,
+            dep_date=train.dep_date,
+            dep_time=train.dep_time,
+            arr_time=train.arr_time,
+            general_seat=train.has_general_seat(),
+            special_seat=train.has_special_seat(),
+            fare=parse_fare(train),
+            raw=train,
+        )
@@ -0,0 +1,151 @@
+# worker/train_api/mock.py
+import random
+import threading
+import time
+
+from .base import BaseTrainAPIWrapper, MockTrain, MockTicket, TrainRecord, normalize_time
+
+
+class MockProviderStats:
+    """
+    Counters shared by mock drivers, read by the benchmark.
+    `reserve_latencies` holds, per successful booking, the seconds between the
+    search that returned the train and the reservation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.searches = 0
+        self.reserves = 0
+        self.errors = 0
+        self.reserve_latencies = []
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_reserve(self, latency):
+        with self._lock:
+            self.reserves += 1
+            self.reserve_latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "logins": self.logins,
+                "searches": self.searches,
+                "reserves": self.reserves,
+                "errors": self.errors,
+                "reserveLatencies": list(self.reserve_latencies),
+            }
+
+
+# Shared by every mock driver unless one is given its own
+mock_stats = MockProviderStats()
+
+
+class MockTrainAPIWrapper(BaseTrainAPIWrapper):
+    """
+    In-process stand-in for a train provider, for local runs and benchmarks.
+
+    Searches return one MockTrain every `headway_minutes` from time_from until
+    midnight. Every call sleeps `latency` seconds (plus up to `jitter`), each
+    train has a seat with probability `seat_probability`, and search/reserve
+    fail with probability `error_rate`. Errors go through the rate limiter the
+    same way the real wrappers report them.
+    """
+
+    def __init__(self, username, password, rate_limiter=None, latency_observer=None, provider="KTX",
+                 latency=0.05, jitter=0.0, seat_probability=0.1, error_rate=0.0,
+                 headway_minutes=30, stats=None):
+        super().__init__(username, password, rate_limiter=rate_limiter, latency_observer=latency_observer)
+        self.provider = provider
+        self.latency = latency
+        self.jitter = jitter
+        self.seat_probability = seat_probability
+        self.error_rate = error_rate
+        self.headway_minutes = headway_minutes
+        self.stats = stats or mock_stats
+        self._random = random.Random()
+
+    def _call_upstream(self):
+        """Simulates the round trip; raises if this call is picked to fail."""
+        time.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self._random.random() < self.error_rate:
+            self.stats.count("errors")
+            raise RuntimeError("Mock: injected upstream error")
+
+    def login(self):
+        with self._upstream_call("login"):
+            time.sleep(self.latency)
+        self.stats.count("logins")
+        self.is_logged_in = True
+        return True
+
+    def search(self, dep_station, arr_station, date, time_from, time_to):
+        if not self.is_logged_in:
+            return []
+        if not self._acquire_budget():
+            return []
+        try:
+            with self._upstream_call("search"):
+                self._call_upstream()
+        except RuntimeError as e:
+            self._report_result(e)
+            return []
+        self._report_result()
+        self.stats.count("searches")
+
+        searched_at = time.monotonic()
+        time_from, time_to = normalize_time(time_from), normalize_time(time_to) or "2359"
+        minutes = int(time_from[:2] or 0) * 60 + int(time_from[2:4] or 0)
+        trains = []
+        while minutes < 24 * 60:
+            dep_time = f"{minutes // 60:02d}{minutes % 60:02d}"
+            if dep_time > time_to:
+                break
+            arr_minutes = min(minutes + 150, 24 * 60 - 1)
+            train = MockTrain(
+                dep_station, arr_station, f"{dep_time}00",
+                has_seat=self._random.random() < self.seat_probability,
+                type=self.provider,
+                train_no=str(100 + minutes // self.headway_minutes),
+                date=date,
+                arr_time=f"{arr_minutes // 60:02d}{arr_minutes % 60:02d}00",
+                special_seat=self._random.random() < self.seat_probability,
+            )
+            train.searched_at = searched_at
+            trains.append(train)
+            minutes += self.headway_minutes
+        return trains
+
+    def reserve(self, train, seat_class=None):
+        if not self.is_logged_in:
+            return None
+        if not self._acquire_budget():
+            return None
+        try:
+            with self._upstream_call("reserve"):
+                self._call_upstream()
+        except RuntimeError as e:
+            self._report_result(e, backoff_on_error=False)
+            return None
+        self._report_result()
+        self.stats.record_reserve(time.monotonic() - getattr(train, "searched_at", time.monotonic()))
+        return MockTicket(train)
+
+    def to_record(self, train):
+        return TrainRecord(
+            train_type=train.type,
+            train_no=train.train_no,
+            dep_station=train.dep,
+            arr_station=train.arr,
+            dep_date=train.date,
+            dep_time=train.time,
+            arr_time=train.arr_time,
+            general_seat=train.has_seat(),
+            special_seat=train.special_seat,
+            fare=0.0,
+            raw=train,
+        )
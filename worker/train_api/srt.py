@@ -1,16 +1,27 @@
 # worker/train_api/srt.py
 from SRT import SRT
-from .base import BaseTrainAPIWrapper, MockTrain, MockTicket
+from SRT.seat_type import SeatType
+from .base import BaseTrainAPIWrapper, MockTrain, MockTicket, TrainRecord, parse_fare, SEAT_CLASS_GENERAL, SEAT_CLASS_SPECIAL
+
+SEAT_TYPES = {
+    None: SeatType.GENERAL_FIRST,
+    SEAT_CLASS_GENERAL: SeatType.GENERAL_ONLY,
+    SEAT_CLASS_SPECIAL: SeatType.SPECIAL_ONLY,
+}
 
 class SRTWrapper(BaseTrainAPIWrapper):
-    def __init__(self, username, password):
-        super().__init__(username, password)
+    provider = "SRT"
+
+    def __init__(self, username, password, rate_limiter=None, latency_observer=None):
+        super().__init__(username, password, rate_limiter=rate_limiter, latency_observer=latency_observer)
         # SRT library can take member number (username) and password
         self.srt = SRT(username, password)
 
     def login(self):
         try:
-            if self.srt.login():
+            with self._upstream_call("login"):
+                logged_in = self.srt.login()
+            if logged_in:
                 self.is_logged_in = True
                 print("SRT: Login successful.")
                 return True
@@ -24,27 +35,55 @@ class SRTWrapper(BaseTrainAPIWrapper):
         if not self.is_logged_in:
             print("SRT: Not logged in. Cannot search.")
             return []
+        if not self._acquire_budget():
+            print("SRT: Request budget exhausted. Skipping search.")
+            return []
         
         try:
             # SRT library search_train takes date (YYYYMMDD) and time (HHMMSS)
-            trains = self.srt.search_train(dep_station, arr_station, date, time_from)
+            with self._upstream_call("search"):
+                trains = self.srt.search_train(dep_station, arr_station, date, time_from)
             print(f"SRT: Found {len(trains)} trains.")
+            self._report_result()
             return trains
         except Exception as e:
             print(f"SRT: Search failed - {e}")
+            self._report_result(e)
             return []
 
-    def reserve(self, train):
+    def reserve(self, train, seat_class=None):
         if not self.is_logged_in:
             print("SRT: Not logged in. Cannot reserve.")
             return None
+        if not self._acquire_budget():
+            print("SRT: Request budget exhausted. Skipping reservation.")
+            return None
         
         try:
-            ticket = self.srt.reserve(train)
+            with self._upstream_call("reserve"):
+                ticket = self.srt.reserve(train, special_seat=SEAT_TYPES.get(seat_class, SeatType.GENERAL_FIRST))
+            self._report_result()
             if ticket:
                 print(f"SRT: Successfully reserved {ticket}")
                 return ticket
         except Exception as e:
             print(f"SRT: Reservation failed - {e}")
+            # Sold-out and similar errors are expected here; only throttling should slow us down
+            self._report_result(e, backoff_on_error=False)
+
+        return None
 
-        return None
\ No newline at end of file
+    def to_record(self, train):
+        return TrainRecord(
+            train_type=train.train_name,
+            train_no=train.train_number,
+            dep_station=train.dep_station_name,
+            arr_station=train.arr_station_name,
+            dep_date=train.dep_date,
+            dep_time=train.dep_time,
+            arr_time=train.arr_time,
+            general_seat=train.general_seat_available(),
+            special_seat=train.special_seat_available(),
+            fare=parse_fare(train),
+            raw=train,
+        )